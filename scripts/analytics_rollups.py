@@ -0,0 +1,265 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database_setup import DatabaseManager, SYSTEM_METRIC_FIELDS
+
+GRANULARITIES = {
+    "hour": lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    "day": lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+
+def to_datetime(value):
+    """Normaliza timestamps guardados como Date o como texto ISO"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+# Campos que identifican un documento de rollup en cada colección destino
+ROLLUP_KEYS = {
+    "chatbot_rollups": ["granularity", "bucket", "scope", "scope_id"],
+    "activity_rollups": ["granularity", "bucket", "scope", "scope_id", "action"],
+    "system_metrics_rollups": ["granularity", "bucket", "scope", "scope_id"],
+}
+
+
+class AnalyticsRollupJob:
+    """Pre-agregados diarios y por hora para el API de analytics
+
+    Cada ejecución procesa solo los documentos crudos insertados desde la
+    última marca de agua (el `_id` más alto ya agregado) y suma sus
+    contribuciones con `$inc` en documentos de rollup por usuario, por tipo
+    de usuario y de toda la plataforma. Se guardan sumas y conteos, no
+    promedios, para que los rollups se puedan combinar y leer sumando unos
+    pocos documentos.
+
+    Los `_id` de varios servidores no llegan en orden estricto, así que solo
+    se agregan documentos cuyo `_id` tenga más de `lag_seconds` de
+    antigüedad. Cada lote es idempotente: antes de escribirlo se anota su
+    último `_id` como `pending_id` en la marca de agua, y cada rollup guarda
+    en `last_batch` el lote que ya sumó. Si el proceso cae a mitad de un
+    lote, la siguiente ejecución rehace exactamente ese lote y los rollups
+    que ya lo tenían no se vuelven a sumar.
+    """
+
+    def __init__(self, db_manager=None, batch_size=5000, lag_seconds=300):
+        self.db_manager = db_manager or DatabaseManager()
+        self.db = self.db_manager.mongo_db
+        self.batch_size = batch_size
+        self.lag_seconds = lag_seconds
+
+    def ensure_indexes(self):
+        for name, key_fields in ROLLUP_KEYS.items():
+            self.db[name].create_index(
+                [("scope", 1), ("scope_id", 1), ("granularity", 1), ("bucket", -1)]
+            )
+            # Único: un upsert que repite un lote ya aplicado falla en vez de duplicar
+            self.db[name].create_index([(field, 1) for field in key_fields], unique=True)
+
+    def _contributions_chatbot(self, doc):
+        ts = to_datetime(doc["timestamp"])
+        values = {
+            "conversations": 1,
+            "duration_sum": doc.get("session_duration_minutes", 0) or 0,
+            "messages": len(doc.get("messages", [])),
+        }
+        if doc.get("satisfaction_rating") is not None:
+            values["satisfaction_sum"] = doc["satisfaction_rating"]
+            values["satisfaction_count"] = 1
+        scopes = [
+            ("platform", "all"),
+            ("user_type", doc.get("user_type")),
+            ("user", doc.get("user_id")),
+        ]
+        return ts, scopes, {}, values
+
+    def _contributions_activity(self, doc):
+        ts = to_datetime(doc["timestamp"])
+        scopes = [
+            ("platform", "all"),
+            ("user_type", doc.get("user_type")),
+            ("user", doc.get("user_id")),
+        ]
+        return ts, scopes, {"action": doc.get("action")}, {"count": 1}
+
+    def _contributions_system(self, doc):
+        ts = to_datetime(doc["timestamp"])
+        values = {"samples": 1}
+        for field in SYSTEM_METRIC_FIELDS:
+            if doc.get(field) is not None:
+                values[f"{field}_sum"] = doc[field]
+        return ts, [("platform", "all")], {}, values
+
+    def _apply(self, target, partials, batch_id):
+        """Suma un lote en `target`, saltando los rollups que ya tienen `batch_id`"""
+        operations = []
+        now = datetime.now()
+        for (granularity, bucket, scope, scope_id, dims), values in partials.items():
+            key = {"granularity": granularity, "bucket": bucket, "scope": scope,
+                   "scope_id": scope_id, **dict(dims)}
+            operations.append(UpdateOne(
+                {**key, "last_batch": {"$ne": batch_id}},
+                {"$inc": dict(values), "$set": {"last_batch": batch_id, "updated_at": now}},
+                upsert=True,
+            ))
+        try:
+            self.db[target].bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Clave duplicada = rollup que ya tenía este lote (re-ejecución tras una caída)
+            errors = [err for err in e.details["writeErrors"] if err["code"] != 11000]
+            if errors:
+                raise
+
+    def _rollup(self, source, target, contributions):
+        """Agrega incrementalmente `source` en `target` desde la marca de agua"""
+        watermarks = self.db["rollup_watermarks"]
+        state = watermarks.find_one({"_id": target}) or {}
+        last_id = state.get("last_id")
+        horizon = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=self.lag_seconds))
+
+        def scan(upper, inclusive=False):
+            query = {"_id": {"$lte" if inclusive else "$lt": upper}}
+            if last_id is not None:
+                query["_id"]["$gt"] = last_id
+            return self.db[source].find(query).sort("_id", 1).batch_size(self.batch_size)
+
+        processed = 0
+        start = time.perf_counter()
+        partials = defaultdict(lambda: defaultdict(float))
+
+        def flush(batch_last_id):
+            nonlocal last_id
+            if partials:
+                watermarks.update_one(
+                    {"_id": target}, {"$set": {"pending_id": batch_last_id}}, upsert=True
+                )
+                self._apply(target, partials, str(batch_last_id))
+                partials.clear()
+            watermarks.update_one(
+                {"_id": target},
+                {"$set": {"last_id": batch_last_id, "updated_at": datetime.now()},
+                 "$unset": {"pending_id": ""}},
+                upsert=True,
+            )
+            last_id = batch_last_id
+
+        def accumulate(doc):
+            ts, scopes, dims, values = contributions(doc)
+            dims_key = tuple(sorted(dims.items()))
+            for granularity, truncate in GRANULARITIES.items():
+                bucket = truncate(ts)
+                for scope, scope_id in scopes:
+                    partial = partials[(granularity, bucket, scope, scope_id, dims_key)]
+                    for field, value in values.items():
+                        partial[field] += value
+
+        # Lote interrumpido en una ejecución anterior: rehacerlo con los mismos límites
+        if "pending_id" in state:
+            for doc in scan(state["pending_id"], inclusive=True):
+                accumulate(doc)
+                processed += 1
+            flush(state["pending_id"])
+
+        batch_last_id = None
+        for doc in scan(horizon):
+            accumulate(doc)
+            batch_last_id = doc["_id"]
+            processed += 1
+            if processed % self.batch_size == 0:
+                flush(batch_last_id)
+                batch_last_id = None
+        if batch_last_id is not None:
+            flush(batch_last_id)
+
+        elapsed = time.perf_counter() - start
+        print(f"  - {source} -> {target}: {processed} documentos nuevos en {elapsed:.2f}s")
+        return processed
+
+    def run(self):
+        """Ejecuta todos los rollups de forma incremental"""
+        print("Actualizando rollups de analytics...")
+        self.ensure_indexes()
+        return {
+            "chatbot_conversations": self._rollup(
+                "chatbot_conversations", "chatbot_rollups", self._contributions_chatbot
+            ),
+            "activity_logs": self._rollup(
+                "activity_logs", "activity_rollups", self._contributions_activity
+            ),
+            "system_metrics": self._rollup(
+                "system_metrics", "system_metrics_rollups", self._contributions_system
+            ),
+        }
+
+    def _range_query(self, scope, scope_id, granularity, days):
+        query = {"scope": scope, "scope_id": scope_id, "granularity": granularity}
+        if days is not None:
+            start = GRANULARITIES["day"](datetime.now() - timedelta(days=days))
+            query["bucket"] = {"$gte": start}
+        return query
+
+    def get_chatbot_stats(self, user_id=None, days=None):
+        """Equivalente a getChatbotStats leyendo rollups diarios"""
+        scope, scope_id = ("user", user_id) if user_id else ("platform", "all")
+        totals = defaultdict(float)
+        for doc in self.db["chatbot_rollups"].find(self._range_query(scope, scope_id, "day", days)):
+            for field in ("conversations", "duration_sum", "messages", "satisfaction_sum", "satisfaction_count"):
+                totals[field] += doc.get(field, 0)
+        if not totals["conversations"]:
+            return {}
+        return {
+            "total_conversations": int(totals["conversations"]),
+            "avg_duration": totals["duration_sum"] / totals["conversations"],
+            "avg_satisfaction": (totals["satisfaction_sum"] / totals["satisfaction_count"]
+                                 if totals["satisfaction_count"] else None),
+            "total_messages": int(totals["messages"]),
+        }
+
+    def get_activity_stats(self, days=30):
+        """Equivalente a getActivityStats: conteos por (acción, tipo de usuario)"""
+        counts = defaultdict(int)
+        query = {"scope": "user_type", "granularity": "day"}
+        query["bucket"] = {"$gte": GRANULARITIES["day"](datetime.now() - timedelta(days=days))}
+        for doc in self.db["activity_rollups"].find(query):
+            counts[(doc.get("action"), doc["scope_id"])] += int(doc["count"])
+        return sorted(
+            [{"_id": {"action": action, "user_type": user_type}, "count": count}
+             for (action, user_type), count in counts.items()],
+            key=lambda s: s["count"],
+            reverse=True,
+        )
+
+    def get_system_metrics(self, days=7, granularity="day"):
+        """Promedios de métricas del sistema por bucket, del más reciente al más antiguo"""
+        docs = self.db["system_metrics_rollups"].find(
+            self._range_query("platform", "all", granularity, days)
+        ).sort("bucket", -1)
+        series = []
+        for doc in docs:
+            point = {"timestamp": doc["bucket"]}
+            for field in SYSTEM_METRIC_FIELDS:
+                if f"{field}_sum" in doc:
+                    point[field] = doc[f"{field}_sum"] / doc["samples"]
+            series.append(point)
+        return series
+
+
+def main():
+    """Función principal para actualizar los rollups de analytics"""
+    job = AnalyticsRollupJob()
+
+    print("=== ROLLUPS DE ANALYTICS ===\n")
+
+    job.run()
+
+    stats = job.get_chatbot_stats(days=30)
+    if stats:
+        print(f"\nConversaciones (30 días): {stats['total_conversations']}")
+        print(f"Satisfacción promedio: {stats['avg_satisfaction']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from database_setup import DatabaseManager
+
+
+class AsyncDatabaseManager:
+    """Variante asíncrona de DatabaseManager para aprovisionar entornos nuevos
+
+    Cada paso bloqueante (índices de una colección, usuarios, siembra de una
+    colección, métricas) corre en un hilo con `asyncio.to_thread` y un
+    semáforo limita cuántos corren a la vez. Las dependencias se expresan
+    esperando tareas: la siembra de una colección espera a sus índices y a
+    los usuarios, y nada más, así que el tiempo total se acerca al del paso
+    más lento en lugar de la suma de todos.
+    """
+
+    def __init__(self, db_manager=None, max_concurrency=8):
+        self.db_manager = db_manager or DatabaseManager()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timings = {}
+
+    async def _run(self, step, func, *args, **kwargs):
+        """Ejecuta una función bloqueante en un hilo, respetando el límite de concurrencia"""
+        async with self.semaphore:
+            start = time.perf_counter()
+            result = await asyncio.to_thread(func, *args, **kwargs)
+            self.timings[step] = time.perf_counter() - start
+        return result
+
+    def _index_tasks(self):
+        """Una tarea por colección de MONGODB_INDEXES, más la del almacén de métricas"""
+        tasks = {
+            name: asyncio.create_task(
+                self._run(f"indexes:{name}", self.db_manager.create_collection_indexes, name)
+            )
+            for name in self.db_manager.MONGODB_INDEXES
+        }
+        tasks["metrics_store"] = asyncio.create_task(
+            self._run("indexes:metrics_store", self.db_manager.setup_metrics_store)
+        )
+        return tasks
+
+    async def setup_mongodb_collections(self):
+        """Crea los índices de todas las colecciones de forma concurrente"""
+        print("Configurando colecciones de MongoDB (concurrente)...")
+        await asyncio.gather(*self._index_tasks().values())
+        print("Colecciones de MongoDB configuradas")
+
+    async def _seed_after(self, name, documents, batch_size, *dependencies):
+        await asyncio.gather(*dependencies)
+        return await self._run(f"seed:{name}", self.db_manager.seed_collection, name, documents, batch_size)
+
+    async def create_sample_data(self, users, days_back=30, batch_size=1000, index_tasks=None):
+        """Siembra cada colección de muestra en su propia tarea"""
+        index_tasks = index_tasks or {}
+        sources = self.db_manager.sample_data_sources(users, days_back)
+        stats = await asyncio.gather(*[
+            self._seed_after(name, documents, batch_size, *([index_tasks[name]] if name in index_tasks else []))
+            for name, documents in sources.items()
+        ])
+        for s in stats:
+            print(f"  - {s['collection']}: {s['inserted'] + s.get('updated', 0)} documentos "
+                  f"({s['docs_per_sec']:.0f} docs/s)")
+        return stats
+
+    async def provision(self, days_back=30, batch_size=1000):
+        """Equivalente concurrente de main() en database_setup.py"""
+        start = time.perf_counter()
+        db = self.db_manager
+
+        supabase_task = asyncio.create_task(self._run("supabase_tables", db.setup_supabase_tables))
+        index_tasks = self._index_tasks()
+        users_task = asyncio.create_task(self._run("test_users", db.create_test_users))
+
+        async def metrics():
+            await asyncio.gather(index_tasks["system_metrics"], index_tasks["metrics_store"])
+            return await self._run("system_metrics", db.generate_system_metrics)
+
+        metrics_task = asyncio.create_task(metrics())
+        users = await users_task
+        sample_stats = await self.create_sample_data(users, days_back, batch_size, index_tasks)
+        await asyncio.gather(supabase_task, metrics_task, *index_tasks.values())
+
+        elapsed = time.perf_counter() - start
+        serial = sum(self.timings.values())
+        slowest = max(self.timings, key=self.timings.get)
+        print(f"\nAprovisionado en {elapsed:.2f}s (suma de pasos {serial:.2f}s, "
+              f"paso más lento '{slowest}' {self.timings[slowest]:.2f}s)")
+        return {
+            "seconds": elapsed,
+            "serial_seconds": serial,
+            "steps": dict(self.timings),
+            "sample_data": sample_stats,
+            "users": users,
+        }
+
+
+def main():
+    """Función principal para configurar las bases de datos de forma concurrente"""
+    manager = AsyncDatabaseManager()
+
+    print("=== CONFIGURACIÓN CONCURRENTE DE BASES DE DATOS EUNONIA ===\n")
+
+    asyncio.run(manager.provision())
+
+    print("\n=== CONFIGURACIÓN COMPLETADA ===")
+    print("Credenciales de usuarios de prueba guardadas en 'test_users.json'")
+
+if __name__ == "__main__":
+    main()
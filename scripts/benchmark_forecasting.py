@@ -0,0 +1,89 @@
+import time
+import json
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_squared_error
+from ml_predictions import MentalHealthPredictor
+from feature_schema import PATIENT_FEATURES
+
+
+def benchmark_multi_horizon(predictor, df, horizons=range(1, 15)):
+    """Compara el costo del pronosticador multi-salida contra un modelo por horizonte"""
+    horizons = list(horizons)
+    # Construcción de objetivos
+    start = time.perf_counter()
+    df, targets = predictor.build_horizon_targets(df, horizons)
+    targets_time = time.perf_counter() - start
+    
+    complete = ~np.isnan(targets).any(axis=1)
+    X = predictor.scaler.transform(PATIENT_FEATURES.assemble(df)[complete])
+    y = targets[complete]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    
+    # Un modelo multi-salida
+    start = time.perf_counter()
+    multi_model = clone(predictor.mood_forecaster).fit(X_train, y_train)
+    multi_fit = time.perf_counter() - start
+    start = time.perf_counter()
+    multi_pred = multi_model.predict(X_test)
+    multi_predict = time.perf_counter() - start
+    
+    # Un modelo independiente por horizonte (mismos hiperparámetros)
+    per_fit = per_predict = 0.0
+    per_pred = np.zeros_like(y_test)
+    for i in range(len(horizons)):
+        start = time.perf_counter()
+        model = clone(predictor.mood_forecaster).fit(X_train, y_train[:, i])
+        per_fit += time.perf_counter() - start
+        start = time.perf_counter()
+        per_pred[:, i] = model.predict(X_test)
+        per_predict += time.perf_counter() - start
+    
+    results = {
+        'horizons': horizons,
+        'training_rows': int(len(X_train)),
+        'targets_build_seconds': targets_time,
+        'multi_output': {
+            'fit_seconds': multi_fit,
+            'predict_seconds': multi_predict,
+            'mse': float(mean_squared_error(y_test, multi_pred)),
+        },
+        'per_horizon': {
+            'fit_seconds': per_fit,
+            'predict_seconds': per_predict,
+            'mse': float(mean_squared_error(y_test, per_pred)),
+        },
+    }
+    
+    print(f"\nObjetivos construidos en {targets_time:.3f}s ({len(horizons)} horizontes)")
+    print(f"{'Estrategia':<16}{'Entrenamiento':>15}{'Predicción':>12}{'MSE':>8}")
+    for name, key in [('Multi-salida', 'multi_output'), ('Por horizonte', 'per_horizon')]:
+        r = results[key]
+        print(f"{name:<16}{r['fit_seconds']:>14.2f}s{r['predict_seconds']:>11.3f}s{r['mse']:>8.3f}")
+    print(f"Aceleración en entrenamiento: {per_fit / multi_fit:.1f}x")
+    
+    return results
+
+
+def main():
+    """Función principal para el benchmark de pronóstico multi-horizonte"""
+    predictor = MentalHealthPredictor()
+    
+    print("=== BENCHMARK DE PRONÓSTICO MULTI-HORIZONTE ===\n")
+    
+    # Los objetivos se construyen antes de descartar las filas sin ánimo a 7 días
+    full = predictor.load_data(drop_future=False)
+    predictor.train_risk_classifier(full.dropna(subset=['future_mood']))
+    full['gender_encoded'] = predictor.label_encoder.transform(full['gender'])
+    predictor.train_mood_forecaster(full)
+    
+    results = benchmark_multi_horizon(predictor, full)
+    
+    with open('forecast_benchmark.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    
+    print(f"\nResultados guardados en 'forecast_benchmark.json'")
+
+if __name__ == "__main__":
+    main()
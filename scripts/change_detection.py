@@ -0,0 +1,342 @@
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+from database_setup import DatabaseManager
+
+
+class PatientChangeState:
+    """Estado O(1) de un paciente: línea base, EWMA rápida y CUSUM inferior"""
+
+    __slots__ = ("n", "mean", "var", "ewma", "cusum", "cooldown")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.ewma = 0.0
+        self.cusum = 0.0
+        self.cooldown = 0
+
+    def to_doc(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_doc(cls, doc):
+        state = cls()
+        for field in cls.__slots__:
+            setattr(state, field, doc[field])
+        return state
+
+
+class MoodChangeDetector:
+    """Detector en streaming de caídas sostenidas del estado de ánimo
+
+    Por paciente se mantiene una línea base (media y varianza: Welford
+    durante los primeros `warmup` registros y después EWMA lenta), una EWMA
+    rápida del ánimo y una CUSUM inferior sobre el ánimo estandarizado,
+    `S = max(0, S - z - k)`. Hay alerta cuando S supera `h` o la EWMA rápida
+    cae `L` desviaciones bajo la línea base. La línea base deja de
+    actualizarse cuando S supera h/2, para que no siga a la caída que se
+    quiere detectar; tras una alerta el paciente queda en silencio
+    `cooldown` registros.
+    """
+
+    def __init__(self, k=0.5, h=8.0, ewma_alpha=0.3, ewma_limit=3.5, baseline_alpha=0.05,
+                 warmup=14, cooldown=7, min_std=0.5):
+        self.k = k
+        self.h = h
+        self.ewma_alpha = ewma_alpha
+        # Desviación estacionaria de la EWMA: sigma * sqrt(alpha / (2 - alpha))
+        self.ewma_limit = ewma_limit * (ewma_alpha / (2 - ewma_alpha)) ** 0.5
+        self.baseline_alpha = baseline_alpha
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.min_std = min_std
+        self.freeze = h / 2
+        self.states = {}
+
+    def __len__(self):
+        return len(self.states)
+
+    def update(self, patient_id, mood):
+        """Procesa un registro; devuelve un dict de alerta o None"""
+        state = self.states.get(patient_id)
+        if state is None:
+            state = self.states[patient_id] = PatientChangeState()
+
+        if state.n < self.warmup:
+            state.n += 1
+            delta = mood - state.mean
+            state.mean += delta / state.n
+            state.var += (delta * (mood - state.mean) - state.var) / state.n
+            state.ewma = state.mean
+            return None
+
+        std = max(state.var ** 0.5, self.min_std)
+        z = (mood - state.mean) / std
+        state.cusum = max(0.0, state.cusum - z - self.k)
+        state.ewma += self.ewma_alpha * (mood - state.ewma)
+        if state.cusum < self.freeze:
+            delta = mood - state.mean
+            state.mean += self.baseline_alpha * delta
+            state.var = (1 - self.baseline_alpha) * (state.var + self.baseline_alpha * delta * delta)
+
+        if state.cooldown:
+            state.cooldown -= 1
+            return None
+        ewma_drop = (state.mean - state.ewma) / std
+        if state.cusum <= self.h and ewma_drop <= self.ewma_limit:
+            return None
+
+        alert = {
+            "patient_id": patient_id,
+            "mood": mood,
+            "baseline": state.mean,
+            "ewma": state.ewma,
+            "cusum": state.cusum,
+            "priority": "urgent" if state.cusum > 2 * self.h or mood <= 3 else "high",
+        }
+        state.cusum = 0.0
+        state.cooldown = self.cooldown
+        return alert
+
+
+def alert_notification(alert, now=None):
+    """Fila de la tabla `notifications` de Supabase para una alerta del detector"""
+    return {
+        "user_id": str(alert["patient_id"]),
+        "title": "Deterioro del estado de ánimo detectado",
+        "message": (
+            f"El ánimo reciente ({alert['ewma']:.1f}) está por debajo de la línea base "
+            f"del paciente ({alert['baseline']:.1f}). Se recomienda contactar con su psicólogo."
+        ),
+        "notification_type": "alert",
+        "priority": alert["priority"],
+        "is_read": False,
+        "created_at": (now or datetime.now()).isoformat(),
+    }
+
+
+def load_history(path):
+    """Historial de registros de ánimo desde CSV, JSON lines, Parquet o un directorio exportado"""
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    elif path.endswith((".jsonl", ".json")):
+        df = pd.read_json(path, lines=True)
+    else:
+        df = pd.read_csv(path)
+    return df.sort_values(["log_date", "patient_id"], kind="stable").reset_index(drop=True)
+
+
+def replay(history, detector=None, shifts=None):
+    """Reproduce un historial por orden de fecha y mide la tasa de alertas
+
+    `history` es un DataFrame (patient_id, log_date, mood_score) o la ruta de
+    un archivo para load_history. Con `shifts` ({paciente: fecha de inicio
+    de una caída conocida}) también se calcula la tasa de detección, el
+    retraso medio en días y las alertas falsas (antes de la caída o en
+    pacientes sin caída).
+    """
+    if isinstance(history, str):
+        history = load_history(history)
+    detector = MoodChangeDetector() if detector is None else detector
+    patient_ids = history["patient_id"].tolist()
+    moods = history["mood_score"].astype(float).tolist()
+    log_dates = history["log_date"].astype(str).tolist()
+
+    start = time.perf_counter()
+    alerts = []
+    for i, (patient_id, mood) in enumerate(zip(patient_ids, moods)):
+        alert = detector.update(patient_id, mood)
+        if alert is not None:
+            alert["log_date"] = log_dates[i]
+            alerts.append(alert)
+    elapsed = time.perf_counter() - start
+
+    n_patients = history["patient_id"].nunique()
+    stats = {
+        "logs": len(history),
+        "patients": n_patients,
+        "alerts": len(alerts),
+        "alerts_per_1000_logs": 1000 * len(alerts) / len(history) if len(history) else 0.0,
+        "patients_alerted": len({a["patient_id"] for a in alerts}) / n_patients if n_patients else 0.0,
+        "logs_per_sec": len(history) / elapsed if elapsed > 0 else 0.0,
+    }
+    if shifts is not None:
+        shifts = {pid: str(date) for pid, date in shifts.items()}
+        first_true = {}
+        false_alerts = 0
+        for alert in alerts:
+            onset = shifts.get(alert["patient_id"])
+            if onset is not None and alert["log_date"] >= onset:
+                first_true.setdefault(alert["patient_id"], alert["log_date"])
+            else:
+                false_alerts += 1
+        delays = [
+            (pd.Timestamp(first_true[pid]) - pd.Timestamp(onset)).days
+            for pid, onset in shifts.items() if pid in first_true
+        ]
+        stats.update({
+            "detection_rate": len(first_true) / len(shifts) if shifts else 0.0,
+            "mean_delay_days": float(np.mean(delays)) if delays else None,
+            "false_alerts": false_alerts,
+        })
+    return stats, alerts
+
+
+def backtest(history, param_grid, shifts=None):
+    """Ejecuta replay con cada combinación de parámetros del detector"""
+    if isinstance(history, str):
+        history = load_history(history)
+    results = []
+    for params in param_grid:
+        stats, _ = replay(history, MoodChangeDetector(**params), shifts)
+        results.append({**params, **stats})
+    return results
+
+
+class MoodChangeJob:
+    """Aplica MoodChangeDetector a los registros nuevos de `mood_logs_sample`
+
+    Sondea por `updated_at` con desempate por `_id` (como MoodScoringWorker,
+    con su propia marca de agua) e inserta las alertas en la tabla
+    `notifications` de Supabase. El estado de cada paciente se guarda en
+    `change_detector_state` junto con la clave del último registro que lo
+    actualizó, así que tras reiniciar se recupera en lugar de repetir el
+    calentamiento, y un lote repetido tras una caída no se aplica dos veces.
+    """
+
+    def __init__(self, db_manager=None, detector=None, batch_size=5000, poll_interval=1.0):
+        self.db_manager = db_manager or DatabaseManager()
+        self.db = self.db_manager.mongo_db
+        self.detector = MoodChangeDetector() if detector is None else detector
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.watermark = self.db["scoring_watermarks"].find_one({"_id": "change_detection"}) or {}
+        self.applied = {}
+
+    def _poll(self):
+        query = {}
+        if "updated_at" in self.watermark:
+            query = {"$or": [
+                {"updated_at": {"$gt": self.watermark["updated_at"]}},
+                {"updated_at": self.watermark["updated_at"], "_id": {"$gt": self.watermark["last_id"]}},
+            ]}
+        cursor = self.db["mood_logs_sample"].find(
+            query, {"patient_id": 1, "mood_score": 1, "updated_at": 1}
+        ).sort([("updated_at", 1), ("_id", 1)]).limit(self.batch_size)
+        return list(cursor)
+
+    def _restore(self, patient_ids):
+        """Carga el estado guardado de los pacientes que aún no están en memoria"""
+        missing = [pid for pid in patient_ids if pid not in self.detector.states]
+        if not missing:
+            return
+        for doc in self.db["change_detector_state"].find({"_id": {"$in": missing}}):
+            self.detector.states[doc["_id"]] = PatientChangeState.from_doc(doc["state"])
+            self.applied[doc["_id"]] = (doc["log_updated_at"], doc["last_id"])
+
+    def process_batch(self, docs):
+        """Actualiza los detectores y guarda las alertas; devuelve las notificaciones"""
+        now = datetime.now()
+        self._restore({doc["patient_id"] for doc in docs})
+        notifications = []
+        changed = {}
+        for doc in docs:
+            patient_id = doc["patient_id"]
+            key = (doc["updated_at"], doc["_id"])
+            # Registro ya incluido en el estado guardado (lote repetido)
+            if patient_id in self.applied and key <= self.applied[patient_id]:
+                continue
+            alert = self.detector.update(patient_id, doc["mood_score"])
+            self.applied[patient_id] = changed[patient_id] = key
+            if alert is not None:
+                notifications.append(alert_notification(alert, now))
+        if notifications:
+            self.db_manager.supabase.table("notifications").insert(notifications).execute()
+
+        if changed:
+            self.db["change_detector_state"].bulk_write([
+                UpdateOne(
+                    {"_id": patient_id},
+                    {"$set": {"state": self.detector.states[patient_id].to_doc(),
+                              "log_updated_at": log_updated_at, "last_id": last_id, "updated_at": now}},
+                    upsert=True,
+                )
+                for patient_id, (log_updated_at, last_id) in changed.items()
+            ], ordered=False)
+        last = docs[-1]
+        self.watermark = {"_id": "change_detection", "updated_at": last["updated_at"], "last_id": last["_id"]}
+        self.db["scoring_watermarks"].replace_one({"_id": "change_detection"}, self.watermark, upsert=True)
+        return notifications
+
+    def run(self, max_idle_polls=None):
+        """Procesa micro-lotes hasta agotar `max_idle_polls` sondeos vacíos (None = siempre)"""
+        print("Iniciando detector de cambios de ánimo...")
+        start = time.perf_counter()
+        stats = {"documents": 0, "alerts": 0}
+        idle = 0
+        while True:
+            docs = self._poll()
+            if docs:
+                idle = 0
+                stats["documents"] += len(docs)
+                stats["alerts"] += len(self.process_batch(docs))
+                continue
+            idle += 1
+            if max_idle_polls is not None and idle >= max_idle_polls:
+                break
+            time.sleep(self.poll_interval)
+        stats["elapsed_seconds"] = time.perf_counter() - start
+        print(f"  {stats['documents']} registros, {stats['alerts']} alertas, "
+              f"{len(self.detector)} pacientes")
+        return stats
+
+
+def generate_history(num_patients=2000, days=180, shift_fraction=0.1, shift_size=2.5, seed=42):
+    """Historial sintético con caídas sostenidas en una fracción de pacientes"""
+    rng = np.random.default_rng(seed)
+    base = rng.normal(6.5, 1.0, num_patients)
+    noise = rng.normal(0, 1.2, (num_patients, days))
+    moods = base[:, None] + noise
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days)
+
+    shifted = rng.choice(num_patients, int(num_patients * shift_fraction), replace=False)
+    onsets = rng.integers(days // 3, days - 14, len(shifted))
+    for patient, onset in zip(shifted, onsets):
+        moods[patient, onset:] -= shift_size
+
+    history = pd.DataFrame({
+        "patient_id": np.repeat(np.arange(num_patients), days),
+        "log_date": np.tile(dates.date.astype(str), num_patients),
+        "mood_score": np.clip(np.round(moods), 1, 10).ravel(),
+    })
+    shifts = {int(p): str(dates[o].date()) for p, o in zip(shifted, onsets)}
+    return history.sort_values(["log_date", "patient_id"], kind="stable").reset_index(drop=True), shifts
+
+
+def main():
+    """Función principal para el backtest del detector de cambios de ánimo"""
+    print("=== DETECCIÓN DE DETERIORO DEL ÁNIMO ===\n")
+
+    history, shifts = generate_history()
+    history.to_csv("mood_history.csv", index=False)
+    print(f"Historial: {len(history)} registros, {len(shifts)} pacientes con caída")
+
+    stats, _ = replay("mood_history.csv", shifts=shifts)
+    print(f"Replay: {stats['logs_per_sec']:.0f} registros/s, {stats['alerts']} alertas, "
+          f"detección {stats['detection_rate']:.1%}, retraso medio {stats['mean_delay_days'] or 0:.1f} días, "
+          f"{stats['false_alerts']} alertas falsas")
+
+    print("\nBacktest de parámetros:")
+    grid = [{"k": k, "h": h} for k in (0.25, 0.5, 1.0) for h in (5.0, 8.0, 12.0)]
+    for result in backtest(history, grid, shifts):
+        print(f"  k={result['k']} h={result['h']}: {result['alerts_per_1000_logs']:.2f} alertas/1000 registros, "
+              f"detección {result['detection_rate']:.1%}, retraso {result['mean_delay_days'] or 0:.1f} días, "
+              f"{result['false_alerts']} falsas")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import time
+import unicodedata
+from datetime import timedelta
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from bson import ObjectId
+from database_setup import DatabaseManager
+from analytics_rollups import to_datetime
+
+# Palabras vacías del español (ya normalizadas, sin tildes)
+SPANISH_STOPWORDS = {
+    "a", "al", "algo", "algunas", "algunos", "ante", "con", "como", "cual", "de", "del",
+    "desde", "donde", "e", "el", "ella", "ellas", "ellos", "en", "entre", "era", "es",
+    "esa", "ese", "eso", "esta", "estas", "este", "esto", "estoy", "fue", "ha", "hay",
+    "la", "las", "le", "les", "lo", "los", "me", "mi", "mis", "mucho", "muy", "nos",
+    "o", "os", "para", "pero", "poco", "por", "porque", "puede", "pueden", "puedes",
+    "que", "se", "si", "sin", "sobre", "son", "su", "sus", "te", "ti", "tu", "tus",
+    "un", "una", "uno", "unos", "unas", "y", "ya", "yo", "vamos",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-zñ0-9]+")
+
+# Separa mensajes en la secuencia de tokens para que una frase no cruce mensajes
+MESSAGE_BREAK = -1
+
+
+def normalize_text(text):
+    """Minúsculas y sin tildes, conservando la ñ"""
+    text = text.lower().replace("ñ", "\0")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.replace("\0", "ñ")
+
+
+def stem(token):
+    """Stemmer ligero: quita plural y género final ('ansiosas' -> 'ansios')"""
+    if len(token) > 4 and token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in "ao":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Términos normalizados de un texto, sin palabras vacías"""
+    return [stem(t) for t in TOKEN_PATTERN.findall(normalize_text(text)) if t not in SPANISH_STOPWORDS]
+
+
+class ConversationIndex:
+    """Índice invertido compacto de conversaciones del chatbot
+
+    Cada término apunta a una lista de números de conversación ordenada
+    (asignados en orden de indexación) con la frecuencia del término. Todas
+    las listas viven en arreglos planos de numpy (`postings_offsets`,
+    `postings_docs`, `postings_counts`) y se guardan en un solo `.npz`.
+    También se guarda la secuencia de tokens de cada conversación para
+    verificar consultas de frase sin volver a MongoDB.
+    """
+
+    def __init__(self, path="chatbot_index.npz"):
+        self.path = path
+        self.terms = []
+        self.term_ids = {}
+        self.postings_offsets = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.empty(0, dtype=np.int32)
+        self.postings_counts = np.empty(0, dtype=np.int32)
+        self.doc_ids = []
+        self.doc_weeks = np.empty(0, dtype="datetime64[D]")
+        self.doc_offsets = np.zeros(1, dtype=np.int64)
+        self.doc_tokens = np.empty(0, dtype=np.int32)
+        self.watermark = {}
+
+    @classmethod
+    def load(cls, path="chatbot_index.npz"):
+        """Carga el índice de disco, o uno vacío si no existe"""
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+        with np.load(path, allow_pickle=False) as data:
+            index.terms = data["terms"].tolist()
+            index.term_ids = {term: i for i, term in enumerate(index.terms)}
+            index.postings_offsets = data["postings_offsets"]
+            index.postings_docs = data["postings_docs"]
+            index.postings_counts = data["postings_counts"]
+            index.doc_ids = data["doc_ids"].tolist()
+            index.doc_weeks = data["doc_weeks"]
+            index.doc_offsets = data["doc_offsets"]
+            index.doc_tokens = data["doc_tokens"]
+            index.watermark = json.loads(str(data["watermark"]))
+        return index
+
+    def save(self):
+        """Escribe el índice de forma atómica"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.array(self.terms, dtype=str),
+                postings_offsets=self.postings_offsets,
+                postings_docs=self.postings_docs,
+                postings_counts=self.postings_counts,
+                doc_ids=np.array(self.doc_ids, dtype=str),
+                doc_weeks=self.doc_weeks,
+                doc_offsets=self.doc_offsets,
+                doc_tokens=self.doc_tokens,
+                watermark=np.array(json.dumps(self.watermark)),
+            )
+        os.replace(tmp_path, self.path)
+
+    @property
+    def num_docs(self):
+        return len(self.doc_ids)
+
+    def _term_id(self, term):
+        if term not in self.term_ids:
+            self.term_ids[term] = len(self.terms)
+            self.terms.append(term)
+        return self.term_ids[term]
+
+    def add_documents(self, documents):
+        """Indexa `(conversation_id, timestamp, [textos])`; devuelve cuántas se añadieron
+
+        Las conversaciones nuevas reciben números mayores que las existentes,
+        así que sus postings se concatenan al final de cada lista y el orden
+        se mantiene con un solo ordenamiento estable por término.
+        """
+        first_doc = self.num_docs
+        new_terms, new_docs, new_counts = [], [], []
+        sequences, weeks = [], []
+        for doc_number, (conversation_id, timestamp, texts) in enumerate(documents, start=first_doc):
+            sequence = []
+            for text in texts:
+                if sequence:
+                    sequence.append(MESSAGE_BREAK)
+                sequence.extend(self._term_id(t) for t in tokenize(text))
+            sequence = np.array(sequence, dtype=np.int32)
+            terms, counts = np.unique(sequence[sequence != MESSAGE_BREAK], return_counts=True)
+            new_terms.append(terms)
+            new_docs.append(np.full(len(terms), doc_number, dtype=np.int32))
+            new_counts.append(counts.astype(np.int32))
+            sequences.append(sequence)
+            day = to_datetime(timestamp).date()
+            weeks.append(day - timedelta(days=day.weekday()))
+            self.doc_ids.append(str(conversation_id))
+
+        added = self.num_docs - first_doc
+        if not added:
+            return 0
+
+        # Reconstruir los arreglos planos: postings existentes + nuevos, agrupados por término
+        old_terms = np.repeat(
+            np.arange(len(self.postings_offsets) - 1, dtype=np.int32), np.diff(self.postings_offsets)
+        )
+        all_terms = np.concatenate([old_terms, *new_terms])
+        order = np.argsort(all_terms, kind="stable")
+        self.postings_docs = np.concatenate([self.postings_docs, *new_docs])[order]
+        self.postings_counts = np.concatenate([self.postings_counts, *new_counts])[order]
+        self.postings_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(all_terms, minlength=len(self.terms)))]
+        ).astype(np.int64)
+
+        lengths = [len(s) for s in sequences]
+        self.doc_tokens = np.concatenate([self.doc_tokens, *sequences]).astype(np.int32)
+        self.doc_offsets = np.concatenate([self.doc_offsets, self.doc_offsets[-1] + np.cumsum(lengths)])
+        self.doc_weeks = np.concatenate([self.doc_weeks, np.array(weeks, dtype="datetime64[D]")])
+        return added
+
+    def postings(self, term):
+        """(números de conversación, frecuencias) de un término ya normalizado"""
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+        return self.postings_docs[start:end], self.postings_counts[start:end]
+
+    def search(self, query, limit=20):
+        """Conversaciones que contienen todos los términos, por frecuencia total"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        docs, scores = self.postings(terms[0])
+        for term in terms[1:]:
+            other_docs, other_counts = self.postings(term)
+            common, left, right = np.intersect1d(docs, other_docs, assume_unique=True, return_indices=True)
+            docs, scores = common, scores[left] + other_counts[right]
+        top = np.argsort(-scores, kind="stable")[:limit]
+        return [(self.doc_ids[d], int(s)) for d, s in zip(docs[top], scores[top])]
+
+    def search_phrase(self, phrase, limit=20):
+        """Conversaciones donde los términos aparecen seguidos dentro de un mensaje"""
+        terms = tokenize(phrase)
+        if not terms or any(t not in self.term_ids for t in terms):
+            return []
+        pattern = np.array([self.term_ids[t] for t in terms], dtype=np.int32)
+        candidates = self.postings(terms[0])[0]
+        for term in terms[1:]:
+            candidates = np.intersect1d(candidates, self.postings(term)[0], assume_unique=True)
+        results = []
+        for doc in candidates:
+            sequence = self.doc_tokens[self.doc_offsets[doc]:self.doc_offsets[doc + 1]]
+            if len(sequence) < len(pattern):
+                continue
+            matches = int((sliding_window_view(sequence, len(pattern)) == pattern).all(axis=1).sum())
+            if matches:
+                results.append((self.doc_ids[doc], matches))
+        results.sort(key=lambda r: r[1], reverse=True)
+        return results[:limit]
+
+    def top_terms_by_week(self, k=10, weeks=None):
+        """Los `k` términos más frecuentes de cada semana (lunes), de la más reciente a la más antigua"""
+        if not len(self.postings_docs):
+            return {}
+        week_values, week_index = np.unique(self.doc_weeks, return_inverse=True)
+        posting_terms = np.repeat(np.arange(len(self.terms)), np.diff(self.postings_offsets))
+        posting_weeks = week_index[self.postings_docs]
+        totals = np.bincount(
+            posting_weeks * len(self.terms) + posting_terms,
+            weights=self.postings_counts,
+            minlength=len(week_values) * len(self.terms),
+        ).reshape(len(week_values), len(self.terms))
+
+        report = {}
+        for w in range(len(week_values) - 1, -1, -1):
+            if weeks is not None and len(report) >= weeks:
+                break
+            row = totals[w]
+            top = np.argsort(-row, kind="stable")[:k]
+            report[str(week_values[w])] = [(self.terms[t], int(row[t])) for t in top if row[t] > 0]
+        return report
+
+
+class ChatbotIndexJob:
+    """Mantiene el índice al día leyendo solo conversaciones nuevas por `_id`
+
+    La marca de agua (último `_id` indexado) se guarda dentro del propio
+    índice, así índice y marca de agua nunca se desincronizan. Se sondea por
+    `_id` y no por `timestamp` porque este campo puede ser Date o texto según
+    quién insertó el documento, y MongoDB solo compara valores del mismo tipo.
+    Un `_id` generado en otro servidor con el reloj atrasado puede quedar por
+    debajo de la marca de agua; esas conversaciones se incorporan con
+    `run(rebuild=True)`.
+    """
+
+    def __init__(self, db_manager=None, index_path="chatbot_index.npz", roles=("user",), batch_size=5000):
+        self.db_manager = db_manager or DatabaseManager()
+        self.db = self.db_manager.mongo_db
+        self.index = ConversationIndex.load(index_path)
+        self.roles = set(roles)
+        self.batch_size = batch_size
+
+    def _documents(self, cursor):
+        for doc in cursor:
+            texts = [m.get("content", "") for m in doc.get("messages", []) if m.get("role") in self.roles]
+            self.index.watermark = {"last_id": str(doc["_id"])}
+            yield doc["_id"], doc["timestamp"], texts
+
+    def run(self, rebuild=False):
+        """Indexa las conversaciones posteriores a la marca de agua y guarda el índice"""
+        print("Actualizando índice de conversaciones...")
+        start = time.perf_counter()
+        if rebuild:
+            self.index = ConversationIndex(self.index.path)
+        query = {}
+        if "last_id" in self.index.watermark:
+            query = {"_id": {"$gt": ObjectId(self.index.watermark["last_id"])}}
+        cursor = self.db["chatbot_conversations"].find(
+            query, {"timestamp": 1, "messages.role": 1, "messages.content": 1}
+        ).sort("_id", 1).batch_size(self.batch_size)
+        added = self.index.add_documents(self._documents(cursor))
+        if added:
+            self.index.save()
+        elapsed = time.perf_counter() - start
+        print(f"  {added} conversaciones nuevas indexadas en {elapsed:.2f}s "
+              f"({self.index.num_docs} en total, {len(self.index.terms)} términos)")
+        return added
+
+
+def main():
+    """Función principal para indexar conversaciones del chatbot"""
+    job = ChatbotIndexJob()
+
+    print("=== ÍNDICE DE CONVERSACIONES DEL CHATBOT ===\n")
+
+    job.run()
+
+    for query in ["dormir", "estrés", "técnicas de relajación"]:
+        start = time.perf_counter()
+        results = job.index.search_phrase(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"'{query}': {len(results)} conversaciones ({elapsed:.2f} ms)")
+
+    print("\nTérminos más frecuentes por semana:")
+    for week, terms in job.index.top_terms_by_week(k=5, weeks=4).items():
+        print(f"  {week}: {', '.join(f'{t} ({c})' for t, c in terms)}")
+
+if __name__ == "__main__":
+    main()
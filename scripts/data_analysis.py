@@ -9,6 +9,9 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, confusion_matrix
 import warnings
+from streaming_stats import MoodStreamSummary
+from patient_tensor import PatientDayTensor
+from feature_schema import aggregate_patient_features
 warnings.filterwarnings('ignore')
 
 class MentalHealthAnalyzer:
@@ -112,6 +115,46 @@ class MentalHealthAnalyzer:
         
         return mood_stats
     
+    def iter_mood_chunks(self, chunk_size=100000):
+        """Itera los registros de ánimo en lotes (fuente de ejemplo para el modo streaming)"""
+        for start in range(0, len(self.mood_data), chunk_size):
+            yield self.mood_data.iloc[start:start + chunk_size]
+    
+    def analyze_mood_patterns_streaming(self, chunks=None, summary=None, k=200):
+        """Analiza patrones de ánimo por lotes con memoria acotada.
+        
+        `chunks` puede ser cualquier iterable de DataFrames o listas de dicts
+        (p. ej. pd.read_csv(..., chunksize=...)). Los cuantiles tienen un error
+        de rango de ~1.65% con k=200; medias, histogramas por día y
+        correlaciones son exactos. Pasar `summary` permite continuar un resumen
+        previo, y `MoodStreamSummary.merge` combina shards o días.
+        """
+        print("\n=== ANÁLISIS DE PATRONES DE ESTADO DE ÁNIMO (STREAMING) ===")
+        
+        if chunks is None:
+            chunks = self.iter_mood_chunks()
+        if summary is None:
+            summary = MoodStreamSummary(k=k)
+        
+        for chunk in chunks:
+            summary.update(chunk)
+        
+        results = summary.to_dict()
+        print(f"Registros procesados: {results['total_records']}")
+        print(f"Mediana de estado de ánimo: {results['quantiles']['mood_score']['0.5']:.2f}")
+        print(f"Percentiles 5-95: {results['quantiles']['mood_score']['0.05']:.2f} - {results['quantiles']['mood_score']['0.95']:.2f}")
+        
+        print("\nPromedio de estado de ánimo por día de la semana:")
+        for day, stats in results['weekday_mood'].items():
+            print(f"  {day}: {stats['mean']:.2f}")
+        
+        print("\nCorrelaciones con estado de ánimo:")
+        print(f"  Ansiedad: {results['correlations']['anxiety_level']:.3f}")
+        print(f"  Horas de sueño: {results['correlations']['sleep_hours']:.3f}")
+        print(f"  Ejercicio: {results['correlations']['exercise_minutes']:.3f}")
+        
+        return summary
+    
     def analyze_session_effectiveness(self):
         """Analiza la efectividad de las sesiones terapéuticas"""
         print("\n=== ANÁLISIS DE EFECTIVIDAD DE SESIONES ===")
@@ -152,21 +195,38 @@ class MentalHealthAnalyzer:
         
         return session_effectiveness
     
+    def analyze_session_effectiveness_dense(self, window=7):
+        """Mejora post-sesión usando ventanas O(1) sobre un PatientDayTensor"""
+        print("\n=== ANÁLISIS DE EFECTIVIDAD DE SESIONES (TENSOR DENSO) ===")
+        
+        tensor = PatientDayTensor.from_frame(self.mood_data, ['mood_score'], patient_col='user_id')
+        sessions = self.session_data[self.session_data['user_id'].isin(tensor.patient_ids)]
+        patient_idx, day_idx = tensor.frame_index(sessions, patient_col='user_id', date_col='session_date')
+        
+        # Ventanas [-7, 0) y (0, +7] alrededor de cada sesión, para todas a la vez
+        n_users = len(tensor.patient_ids)
+        pre_sum = np.bincount(patient_idx, tensor.window_sum(patient_idx, day_idx - window, day_idx, 'mood_score'), n_users)
+        pre_count = np.bincount(patient_idx, tensor.window_counts(patient_idx, day_idx - window, day_idx), n_users)
+        post_sum = np.bincount(patient_idx, tensor.window_sum(patient_idx, day_idx + 1, day_idx + window + 1, 'mood_score'), n_users)
+        post_count = np.bincount(patient_idx, tensor.window_counts(patient_idx, day_idx + 1, day_idx + window + 1), n_users)
+        
+        valid = (pre_count > 0) & (post_count > 0)
+        improvement = pd.Series(
+            post_sum[valid] / post_count[valid] - pre_sum[valid] / pre_count[valid],
+            index=tensor.patient_ids[valid]
+        )
+        if len(improvement) > 0:
+            print(f"Mejora promedio post-sesión: {improvement.mean():.2f} puntos")
+            print(f"Usuarios con mejora: {(improvement > 0).sum()}/{len(improvement)} ({(improvement > 0).mean()*100:.1f}%)")
+        
+        return improvement
+    
     def predict_risk_levels(self):
         """Predice niveles de riesgo usando machine learning"""
         print("\n=== PREDICCIÓN DE NIVELES DE RIESGO ===")
         
         # Preparar datos para ML
-        user_features = self.mood_data.groupby('user_id').agg({
-            'mood_score': ['mean', 'std', 'min'],
-            'anxiety_level': ['mean', 'max'],
-            'sleep_hours': 'mean',
-            'exercise_minutes': 'mean',
-            'social_interaction': 'mean'
-        }).round(2)
-        
-        # Aplanar nombres de columnas
-        user_features.columns = ['_'.join(col).strip() for col in user_features.columns]
+        user_features = aggregate_patient_features(self.mood_data, key='user_id')
         
         # Crear etiquetas de riesgo basadas en criterios clínicos
         def calculate_risk(row):
@@ -0,0 +1,187 @@
+import time
+import json
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.ensemble import GradientBoostingRegressor
+from ml_predictions import MentalHealthPredictor
+from feature_schema import PATIENT_FEATURES
+
+
+def _tree_leaf_contributions(tree, n_features, scale, normalize):
+    """Contribución acumulada por característica de cada hoja de un árbol
+
+    Cada nodo no raíz aporta `valor(nodo) - valor(padre)` a la característica
+    con la que se dividió el padre (método de Saabas); la suma de esos aportes
+    a lo largo del camino hasta una hoja se calcula por niveles de profundidad.
+    Devuelve los ids de las hojas, la tabla (hojas × características·salidas)
+    y el valor de la raíz, que es la parte de la predicción que no depende de X.
+    """
+    tree_ = tree.tree_
+    values = tree_.value.reshape(tree_.node_count, -1).astype(float)
+    if normalize:
+        # Clasificación: fracciones por clase
+        values = values / values.sum(axis=1, keepdims=True)
+    values *= scale
+    n_outputs = values.shape[1]
+
+    cumulative = np.zeros((tree_.node_count, n_features, n_outputs))
+    level = np.array([0])
+    while len(level):
+        internal = level[tree_.children_left[level] >= 0]
+        for children in (tree_.children_left[internal], tree_.children_right[internal]):
+            cumulative[children] = cumulative[internal]
+            cumulative[children, tree_.feature[internal]] += values[children] - values[internal]
+        level = np.concatenate([tree_.children_left[internal], tree_.children_right[internal]])
+
+    leaves = np.nonzero(tree_.children_left < 0)[0]
+    return leaves, cumulative[leaves].reshape(len(leaves), -1), values[0]
+
+
+class TreeExplainer:
+    """Atribuciones por característica para bosques y gradient boosting, por lotes
+
+    La contribución acumulada de cada hoja de todos los árboles se calcula una
+    sola vez. Explicar un lote es una llamada a `apply` (hoja de cada árbol)
+    más un producto disperso (indicador de hojas × tabla de hojas), sin
+    bucles por paciente ni por árbol. Para cada fila,
+    `bias + contributions.sum(axis=1)` reproduce la predicción.
+    """
+
+    def __init__(self, model, feature_names=None):
+        self.model = model
+        self.feature_names = feature_names or PATIENT_FEATURES.names
+        self.n_features = model.n_features_in_
+        self.is_boosting = isinstance(model, GradientBoostingRegressor)
+        self.is_classifier = hasattr(model, "classes_")
+        trees = list(model.estimators_.ravel()) if self.is_boosting else list(model.estimators_)
+        self.n_trees = len(trees)
+
+        scale = model.learning_rate if self.is_boosting else 1.0 / len(trees)
+        tables, roots = [], []
+        # Columna de la tabla de hojas para (árbol, nodo): offset del árbol + posición de la hoja
+        self.node_offsets = np.zeros(len(trees), dtype=np.int64)
+        leaf_columns = []
+        n_nodes = n_leaves = 0
+        for t, tree in enumerate(trees):
+            leaves, table, root = _tree_leaf_contributions(
+                tree, self.n_features, scale, normalize=self.is_classifier
+            )
+            columns = np.full(tree.tree_.node_count, -1, dtype=np.int64)
+            columns[leaves] = n_leaves + np.arange(len(leaves))
+            self.node_offsets[t] = n_nodes
+            leaf_columns.append(columns)
+            tables.append(table)
+            roots.append(root)
+            n_nodes += tree.tree_.node_count
+            n_leaves += len(leaves)
+        self.leaf_columns = np.concatenate(leaf_columns)
+        self.leaf_table = np.vstack(tables)
+        self.root_value = np.sum(roots, axis=0)
+        self.n_outputs = len(self.root_value)
+
+    def explain(self, X):
+        """(bias, contribuciones) con formas (n, salidas) y (n, características, salidas)"""
+        X = np.asarray(X, dtype=np.float32)
+        leaves = self.model.apply(X).reshape(len(X), self.n_trees).astype(np.int64)
+        columns = self.leaf_columns[leaves + self.node_offsets]
+        indicator = sparse.csr_matrix(
+            (np.ones(columns.size), columns.ravel(), np.arange(0, columns.size + 1, self.n_trees)),
+            shape=(len(X), len(self.leaf_table)),
+        )
+        contributions = np.asarray(indicator @ self.leaf_table)
+        contributions = contributions.reshape(len(X), self.n_features, self.n_outputs)
+        bias = np.tile(self.root_value, (len(X), 1))
+        if self.is_boosting:
+            bias += self.model.init_.predict(X).reshape(len(X), -1)
+        return bias, contributions
+
+
+def top_contributions(contributions, feature_names, k=3):
+    """Las `k` características con mayor contribución absoluta por fila (una salida)"""
+    order = np.argsort(-np.abs(contributions), axis=1)[:, :k]
+    return [
+        [{"feature": feature_names[j], "contribution": float(row[j])} for j in indices]
+        for row, indices in zip(contributions, order)
+    ]
+
+
+def explain_patients(predictor, data, top_k=3, explainers=None):
+    """Riesgo, ánimo futuro y sus principales factores para un lote de pacientes
+
+    `data` es cualquier entrada aceptada por PATIENT_FEATURES.assemble. Para
+    el riesgo se explica la probabilidad de la clase predicha. Los
+    explicadores se pueden pasar ya construidos para reutilizarlos entre lotes.
+    """
+    explainers = explainers or {
+        "risk": TreeExplainer(predictor.risk_classifier),
+        "mood": TreeExplainer(predictor.mood_predictor),
+    }
+    X = predictor.scaler.transform(PATIENT_FEATURES.assemble(data))
+    names = PATIENT_FEATURES.names
+
+    risk_bias, risk_contributions = explainers["risk"].explain(X)
+    probabilities = risk_bias + risk_contributions.sum(axis=1)
+    predicted = probabilities.argmax(axis=1)
+    rows = np.arange(len(X))
+    risk_reasons = top_contributions(risk_contributions[rows, :, predicted], names, top_k)
+
+    mood_bias, mood_contributions = explainers["mood"].explain(X)
+    mood_reasons = top_contributions(mood_contributions[:, :, 0], names, top_k)
+    future_mood = mood_bias[:, 0] + mood_contributions[:, :, 0].sum(axis=1)
+
+    classes = predictor.risk_classifier.classes_
+    return [
+        {
+            "risk_level": classes[predicted[i]],
+            "risk_probability": float(probabilities[i, predicted[i]]),
+            "risk_factors": risk_reasons[i],
+            "predicted_mood": round(float(future_mood[i]), 1),
+            "mood_factors": mood_reasons[i],
+        }
+        for i in range(len(X))
+    ]
+
+
+def main():
+    """Función principal para precalcular explicaciones de predicciones"""
+    predictor = MentalHealthPredictor()
+    if not predictor.load_models():
+        raise SystemExit("No hay modelos entrenados: ejecuta ml_predictions.py antes de las explicaciones")
+
+    print("=== EXPLICACIONES DE PREDICCIONES ===\n")
+
+    df = predictor.load_data()
+    df['gender_encoded'] = predictor.label_encoder.transform(df['gender'])
+    latest = df.sort_values('date').groupby('patient_id').tail(1)
+
+    start = time.perf_counter()
+    explainers = {
+        "risk": TreeExplainer(predictor.risk_classifier),
+        "mood": TreeExplainer(predictor.mood_predictor),
+    }
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    explanations = explain_patients(predictor, latest, explainers=explainers)
+    elapsed = time.perf_counter() - start
+    print(f"Explicadores construidos en {build_seconds:.2f}s")
+    print(f"{len(explanations)} pacientes explicados en {elapsed:.2f}s "
+          f"({len(explanations) / elapsed:.0f} pacientes/s)")
+
+    high_risk = [
+        (patient_id, e) for patient_id, e in zip(latest['patient_id'], explanations)
+        if e['risk_level'] == 'high'
+    ]
+    for patient_id, explanation in high_risk[:3]:
+        factors = ", ".join(f"{f['feature']} ({f['contribution']:+.3f})" for f in explanation['risk_factors'])
+        print(f"  Paciente {patient_id}: riesgo alto por {factors}")
+
+    output = pd.DataFrame({'patient_id': latest['patient_id'].to_numpy(), 'explanation': explanations})
+    with open('risk_explanations.json', 'w') as f:
+        json.dump(output.to_dict('records'), f, indent=2, default=str)
+
+    print(f"\nExplicaciones guardadas en 'risk_explanations.json'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from collections import namedtuple
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+from numpy.lib import recfunctions
+
+# Definición de una característica: nombre, tipo lógico y rango válido (inclusive)
+FeatureSpec = namedtuple("FeatureSpec", ["name", "dtype", "low", "high"])
+
+
+class FeatureSchema:
+    """Nombres, tipos, orden y rangos de las características de un modelo
+
+    Ensambla matrices float32 a partir de un dict, una lista de dicts, un
+    DataFrame o un arreglo estructurado, escribiendo directamente en un
+    buffer preasignado (o en `out` si se pasa uno) y validando que no falten
+    valores ni haya valores fuera de rango.
+    """
+
+    def __init__(self, features):
+        self.features = [FeatureSpec(*f) for f in features]
+        self.names = [f.name for f in self.features]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.low = np.array([f.low for f in self.features], dtype=np.float32)
+        self.high = np.array([f.high for f in self.features], dtype=np.float32)
+        self._getter = itemgetter(*self.names)
+
+    def __len__(self):
+        return len(self.features)
+
+    @property
+    def structured_dtype(self):
+        """dtype de numpy para arreglos estructurados con estas características"""
+        return np.dtype([(f.name, f.dtype) for f in self.features])
+
+    def empty(self, n_rows):
+        """Buffer float32 (n_rows × características) sin inicializar"""
+        return np.empty((n_rows, len(self.features)), dtype=np.float32)
+
+    def _buffer(self, n_rows, out):
+        if out is None:
+            return self.empty(n_rows)
+        if out.shape[0] < n_rows or out.shape[1] != len(self.features) or out.dtype != np.float32:
+            raise ValueError(f"Buffer incompatible: se esperaba float32 de ({n_rows}, {len(self.features)})")
+        return out[:n_rows]
+
+    def from_records(self, records, out=None):
+        """Filas desde una lista de dicts (una tupla por registro con itemgetter)"""
+        X = self._buffer(len(records), out)
+        try:
+            X[:] = [self._getter(record) for record in records]
+        except KeyError as e:
+            raise ValueError(f"Falta la característica {e} en los datos del paciente") from None
+        return X
+
+    def from_frame(self, df, out=None):
+        """Filas desde un DataFrame que contiene todas las columnas del esquema"""
+        missing = [name for name in self.names if name not in df.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas de características: {', '.join(missing)}")
+        X = self._buffer(len(df), out)
+        for j, name in enumerate(self.names):
+            X[:, j] = df[name].to_numpy()
+        return X
+
+    def from_structured(self, array, out=None):
+        """Filas desde un arreglo estructurado de numpy"""
+        missing = [name for name in self.names if name not in array.dtype.names]
+        if missing:
+            raise ValueError(f"Faltan campos de características: {', '.join(missing)}")
+        X = self._buffer(len(array), out)
+        X[:] = recfunctions.structured_to_unstructured(array[self.names], dtype=np.float32)
+        return X
+
+    def invalid_mask(self, X):
+        """Máscara (filas × características) de valores faltantes o fuera de rango"""
+        return np.isnan(X) | (X < self.low) | (X > self.high)
+
+    def invalid_rows(self, X):
+        """Índices de las filas con algún valor faltante o fuera de rango"""
+        return np.nonzero(self.invalid_mask(X).any(axis=1))[0]
+
+    def describe_row(self, x):
+        """Texto con las características inválidas de una fila"""
+        invalid = self.invalid_mask(x.reshape(1, -1))[0]
+        return ", ".join(
+            f"{self.names[j]}={x[j]:g} (rango {self.low[j]:g}-{self.high[j]:g})"
+            for j in np.nonzero(invalid)[0]
+        )
+
+    def validate(self, X):
+        """Lanza ValueError si hay valores faltantes o fuera de rango"""
+        invalid = self.invalid_mask(X)
+        if invalid.any():
+            counts = invalid.sum(axis=0)
+            details = ", ".join(
+                f"{name} ({int(count)} filas, rango {self.low[j]:g}-{self.high[j]:g})"
+                for j, (name, count) in enumerate(zip(self.names, counts)) if count
+            )
+            raise ValueError(f"Características inválidas: {details}")
+        return X
+
+    def assemble(self, data, out=None, validate=True):
+        """Matriz float32 de características en el orden del esquema"""
+        if isinstance(data, pd.DataFrame):
+            X = self.from_frame(data, out)
+        elif isinstance(data, dict):
+            X = self.from_records([data], out)
+        elif isinstance(data, np.ndarray) and data.dtype.names:
+            X = self.from_structured(data, out)
+        elif isinstance(data, np.ndarray):
+            if data.ndim != 2 or data.shape[1] != len(self.features):
+                raise ValueError(f"Se esperaban {len(self.features)} columnas, se recibieron {data.shape}")
+            X = self._buffer(len(data), out)
+            X[:] = data
+        else:
+            X = self.from_records(list(data), out)
+        return self.validate(X) if validate else X
+
+
+# Características de paciente usadas por todos los modelos de MentalHealthPredictor
+PATIENT_FEATURES = FeatureSchema([
+    ("age", np.int16, 18, 100),
+    ("mood_score", np.float32, 1, 10),
+    ("anxiety_level", np.float32, 1, 10),
+    ("sleep_hours", np.float32, 0, 24),
+    ("exercise_minutes", np.int16, 0, 1440),
+    ("social_interaction", np.int8, 0, 1),
+    ("on_medication", np.int8, 0, 1),
+    ("therapy_sessions_week", np.int8, 0, 21),
+    ("mood_trend", np.float32, 1, 10),
+    ("anxiety_trend", np.float32, 1, 10),
+    ("weekday", np.int8, 0, 6),
+    ("day_of_year", np.int16, 1, 366),
+    ("gender_encoded", np.int8, 0, 2),
+])
+
+
+# Agregados por paciente del historial de ánimo (los de predict_risk_levels)
+RISK_AGGREGATES = {
+    'mood_score': ['mean', 'std', 'min'],
+    'anxiety_level': ['mean', 'max'],
+    'sleep_hours': 'mean',
+    'exercise_minutes': 'mean',
+    'social_interaction': 'mean',
+}
+
+
+def aggregate_patient_features(mood_data, key='patient_id'):
+    """Agregados por paciente con columnas aplanadas ('mood_score_mean', ...)"""
+    features = mood_data.groupby(key).agg(RISK_AGGREGATES).round(2)
+    features.columns = ['_'.join(col).strip() for col in features.columns]
+    return features
@@ -0,0 +1,169 @@
+import os
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+import joblib
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
+from sklearn.model_selection import StratifiedKFold, KFold, ParameterGrid
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import mean_squared_error
+from ml_predictions import MentalHealthPredictor
+from feature_schema import PATIENT_FEATURES
+
+ESTIMATORS = {
+    'risk': (RandomForestClassifier, {'random_state': 42}),
+    'mood': (GradientBoostingRegressor, {'random_state': 42}),
+}
+
+DEFAULT_GRIDS = {
+    'risk': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [6, 10, 14, None],
+        'min_samples_leaf': [1, 2, 5],
+    },
+    'mood': {
+        'n_estimators': [100, 200, 400],
+        'learning_rate': [0.05, 0.1, 0.2],
+        'max_depth': [3, 4, 6],
+    },
+}
+
+# Pliegues compartidos por proceso (cargados una vez por el inicializador del pool)
+_FOLDS = None
+
+
+def precompute_folds(X, y, n_splits=5, stratify=True, random_state=42):
+    """Escala cada pliegue de validación cruzada una sola vez para todos los candidatos
+
+    Cada pliegue guarda además una permutación estratificada de sus filas de
+    entrenamiento, de modo que los primeros n elementos son una submuestra
+    representativa para las rondas baratas de successive halving.
+    """
+    splitter = StratifiedKFold(n_splits, shuffle=True, random_state=random_state) if stratify \
+        else KFold(n_splits, shuffle=True, random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    folds = []
+    for train_idx, val_idx in splitter.split(X, y):
+        scaler = StandardScaler().fit(X[train_idx])
+        X_train = scaler.transform(X[train_idx]).astype(np.float32)
+        y_train = y[train_idx]
+        if stratify:
+            # Intercalar clases para que cualquier prefijo conserve las proporciones
+            order = np.argsort(rng.random(len(y_train)))
+            _, inverse = np.unique(y_train[order], return_inverse=True)
+            rank_in_class = np.zeros(len(order))
+            for cls in np.unique(inverse):
+                members = np.nonzero(inverse == cls)[0]
+                rank_in_class[members] = np.arange(len(members)) / len(members)
+            order = order[np.argsort(rank_in_class, kind='stable')]
+        else:
+            order = rng.permutation(len(y_train))
+        folds.append({
+            'X_train': X_train[order],
+            'y_train': y_train[order],
+            'X_val': scaler.transform(X[val_idx]).astype(np.float32),
+            'y_val': y[val_idx],
+        })
+    return folds
+
+
+def _init_worker(folds_path):
+    global _FOLDS
+    # mmap_mode: los procesos comparten las páginas del archivo en lugar de copiarlas
+    _FOLDS = joblib.load(folds_path, mmap_mode='r')
+
+
+def _evaluate_candidate(task):
+    candidate_id, model_type, params, n_rows = task
+    estimator_class, base_params = ESTIMATORS[model_type]
+    scores = []
+    start = time.perf_counter()
+    for fold in _FOLDS:
+        model = estimator_class(**base_params, **params)
+        model.fit(fold['X_train'][:n_rows], fold['y_train'][:n_rows])
+        y_pred = model.predict(fold['X_val'])
+        if model_type == 'risk':
+            scores.append(float((y_pred == fold['y_val']).mean()))
+        else:
+            scores.append(-float(mean_squared_error(fold['y_val'], y_pred)))
+    fit_seconds = time.perf_counter() - start
+    return candidate_id, float(np.mean(scores)), float(np.std(scores)), fit_seconds
+
+
+def successive_halving_search(X, y, model_type='risk', param_grid=None, n_splits=5,
+                              eta=3, min_rows=500, n_workers=None):
+    """Búsqueda de hiperparámetros por successive halving en un pool de procesos
+
+    En cada ronda se evalúan los candidatos vivos con `min_rows * eta**ronda`
+    filas por pliegue y solo pasa el mejor 1/eta. El puntaje es la precisión
+    (riesgo) o el MSE negativo (ánimo), promediado sobre pliegues compartidos.
+    """
+    param_grid = param_grid or DEFAULT_GRIDS[model_type]
+    candidates = list(ParameterGrid(param_grid))
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+
+    folds = precompute_folds(X, y, n_splits=n_splits, stratify=model_type == 'risk')
+    max_rows = len(folds[0]['y_train'])
+
+    fd, folds_path = tempfile.mkstemp(suffix='.folds.pkl')
+    os.close(fd)
+    joblib.dump(folds, folds_path)
+
+    history = {i: {'candidate': i, **params, 'rounds': 0} for i, params in enumerate(candidates)}
+    alive = list(range(len(candidates)))
+    n_rows = min(min_rows, max_rows)
+    round_number = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(folds_path,)) as pool:
+            while True:
+                round_number += 1
+                print(f"Ronda {round_number}: {len(alive)} candidatos con {n_rows} filas por pliegue")
+                tasks = [(i, model_type, candidates[i], n_rows) for i in alive]
+                for candidate_id, score, std, fit_seconds in pool.map(_evaluate_candidate, tasks):
+                    history[candidate_id].update({
+                        'rounds': round_number,
+                        'rows_per_fold': n_rows,
+                        'score': score,
+                        'score_std': std,
+                        'fit_seconds': fit_seconds,
+                    })
+
+                if n_rows >= max_rows:
+                    break
+                alive.sort(key=lambda i: history[i]['score'], reverse=True)
+                alive = alive[:max(1, len(alive) // eta)]
+                # El ganador siempre se evalúa con los pliegues completos
+                n_rows = max_rows if len(alive) == 1 else min(n_rows * eta, max_rows)
+    finally:
+        os.remove(folds_path)
+
+    # Los candidatos que llegaron más lejos van primero, luego por puntaje
+    table = pd.DataFrame(history.values()).sort_values(['rounds', 'score'], ascending=[False, False])
+    return table.reset_index(drop=True)
+
+
+def main():
+    """Función principal para la búsqueda de hiperparámetros"""
+    predictor = MentalHealthPredictor()
+
+    print("=== BÚSQUEDA DE HIPERPARÁMETROS ===\n")
+
+    df = predictor.load_data()
+    df['gender_encoded'] = predictor.label_encoder.fit_transform(df['gender'])
+    X = PATIENT_FEATURES.assemble(df)
+
+    for model_type, target in [('risk', 'risk_level'), ('mood', 'future_mood')]:
+        print(f"\nModelo: {model_type}")
+        table = successive_halving_search(X, df[target], model_type=model_type)
+        print(table.head(10).to_string(index=False))
+        table.to_csv(f'hyperparameter_search_{model_type}.csv', index=False)
+
+    print(f"\nTablas guardadas en 'hyperparameter_search_*.csv'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+import time
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+from database_setup import DatabaseManager, batched
+
+# Forma de consulta: `filter` y `pipeline` reciben los parámetros muestreados
+# (user_id, patient_id, psychologist_id, prediction_type, since). `partial` es
+# un predicado constante que se propone como partialFilterExpression.
+QueryShape = namedtuple(
+    "QueryShape",
+    ["name", "collection", "filter", "sort", "limit", "pipeline", "partial"],
+    defaults=(None, None, None, None, None),
+)
+
+# Consultas que emite lib/mongodb.ts (más la de sesiones de riesgo de session_analysis)
+QUERY_SHAPES = [
+    QueryShape(
+        "getChatbotConversations", "chatbot_conversations",
+        filter=lambda p: {"user_id": p["user_id"]}, sort=[("timestamp", -1)], limit=10,
+    ),
+    QueryShape(
+        "getChatbotStats", "chatbot_conversations",
+        pipeline=lambda p: [
+            {"$match": {"user_id": p["user_id"]}},
+            {"$group": {
+                "_id": None,
+                "total_conversations": {"$sum": 1},
+                "avg_duration": {"$avg": "$session_duration_minutes"},
+                "avg_satisfaction": {"$avg": "$satisfaction_rating"},
+                "total_messages": {"$sum": {"$size": "$messages"}},
+            }},
+        ],
+    ),
+    QueryShape(
+        "getSessionAnalysis", "session_analysis",
+        filter=lambda p: {"patient_id": p["patient_id"]}, sort=[("session_date", -1)], limit=5,
+    ),
+    QueryShape(
+        "getRiskSessions", "session_analysis",
+        filter=lambda p: {"psychologist_id": p["psychologist_id"], "analysis.sentiment_score": {"$lt": -0.5}},
+        sort=[("session_date", -1)], limit=20,
+        partial={"analysis.sentiment_score": {"$lt": -0.5}},
+    ),
+    QueryShape(
+        "getLatestMLPrediction", "ml_predictions",
+        filter=lambda p: {"user_id": p["user_id"], "prediction_type": p["prediction_type"]},
+        sort=[("prediction_date", -1)], limit=1,
+    ),
+    QueryShape(
+        "getMLPredictions", "ml_predictions",
+        filter=lambda p: {"user_id": p["user_id"]}, sort=[("prediction_date", -1)], limit=10,
+    ),
+    QueryShape(
+        "getSystemMetrics", "system_metrics",
+        filter=lambda p: {"timestamp": {"$gte": p["since"]}}, sort=[("timestamp", -1)],
+    ),
+    QueryShape(
+        "getLatestSystemMetrics", "system_metrics",
+        filter=lambda p: {}, sort=[("timestamp", -1)], limit=1,
+    ),
+    QueryShape(
+        "getActivityLogs(user)", "activity_logs",
+        filter=lambda p: {"user_id": p["user_id"]}, sort=[("timestamp", -1)], limit=50,
+    ),
+    QueryShape(
+        "getActivityLogs(all)", "activity_logs",
+        filter=lambda p: {}, sort=[("timestamp", -1)], limit=50,
+    ),
+    QueryShape(
+        "getActivityStats", "activity_logs",
+        pipeline=lambda p: [
+            {"$match": {"timestamp": {"$gte": p["since"]}}},
+            {"$group": {"_id": {"action": "$action", "user_type": "$user_type"}, "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+        ],
+    ),
+]
+
+ACTIVITY_ACTIONS = ["login", "logout", "view_dashboard", "log_mood", "chat_message", "book_session"]
+PREDICTION_TYPES = ["risk_level", "mood_forecast", "intervention_recommendation"]
+
+
+def _walk(node):
+    """Recorre en profundidad todos los dicts anidados de un plan de explain"""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def _first(explain, key):
+    return next((node[key] for node in _walk(explain) if key in node), {})
+
+
+def summarize_explain(explain):
+    """Etapas del plan ganador y contadores de executionStats"""
+    winning = _first(explain, "winningPlan")
+    stats = _first(explain, "executionStats")
+    stages = [node["stage"] for node in _walk(winning) if "stage" in node]
+    indexes = sorted({node["indexName"] for node in _walk(winning) if "indexName" in node})
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages,
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "docs_examined": stats.get("totalDocsExamined", 0),
+        "returned": stats.get("nReturned", 0),
+    }
+
+
+def recommend_index(shape, params):
+    """Índice compuesto según la regla igualdad-orden-rango (ESR)
+
+    Los campos de igualdad van primero, luego los de orden con su dirección y
+    al final los de rango; los campos del predicado `partial` se omiten de
+    las claves porque el filtro parcial ya los resuelve.
+    """
+    if shape.pipeline:
+        match = next((stage["$match"] for stage in shape.pipeline(params) if "$match" in stage), {})
+    else:
+        match = shape.filter(params)
+    partial = shape.partial or {}
+    equality = [f for f, v in match.items() if f not in partial and not isinstance(v, dict)]
+    ranges = [f for f, v in match.items() if f not in partial and isinstance(v, dict)]
+    keys = [(f, 1) for f in equality]
+    for field, direction in shape.sort or []:
+        if field not in equality:
+            keys.append((field, direction))
+    keys += [(f, 1) for f in ranges if f not in dict(keys)]
+    if not keys:
+        return None
+    options = {"partialFilterExpression": partial} if partial else {}
+    return keys, options
+
+
+def _index_covers(index_keys, keys):
+    """True si un índice existente tiene `keys` como prefijo (o su inverso exacto)"""
+    prefix = list(index_keys)[:len(keys)]
+    reversed_keys = [(f, -d) for f, d in keys]
+    return prefix == keys or prefix == reversed_keys
+
+
+class IndexAdvisor:
+    """Siembra datos, mide las formas de consulta y propone índices
+
+    Trabaja sobre una base separada (`eunonia_index_advisor` por defecto)
+    con los índices de DatabaseManager.MONGODB_INDEXES como punto de
+    partida. Para cada forma de QUERY_SHAPES ejecuta explain con
+    executionStats y mide la latencia con parámetros muestreados; si el plan
+    recorre la colección, ordena en memoria o examina muchos más documentos
+    de los que devuelve, propone el índice ESR y, con `apply`, lo crea y
+    vuelve a medir.
+    """
+
+    def __init__(self, db_manager=None, database="eunonia_index_advisor", repeats=50, seed=42):
+        self.db_manager = db_manager or DatabaseManager()
+        self.db = self.db_manager.mongo_client[database]
+        self.repeats = repeats
+        self.rng = random.Random(seed)
+        self.users = []
+        self.psychologists = []
+
+    def _insert(self, collection_name, documents, batch_size=5000):
+        collection = self.db[collection_name]
+        inserted = 0
+        for batch in batched(documents, batch_size):
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        return inserted
+
+    def seed(self, num_users=2000, num_psychologists=50, days_back=90, drop=True):
+        """Siembra las colecciones de lib/mongodb.ts a la escala indicada"""
+        print(f"Sembrando {num_users} usuarios, {days_back} días...")
+        if drop:
+            for name in {shape.collection for shape in QUERY_SHAPES}:
+                self.db.drop_collection(name)
+        for collection_name, indexes in DatabaseManager.MONGODB_INDEXES.items():
+            for keys, options in indexes:
+                self.db[collection_name].create_index(keys, **options)
+
+        rng = self.rng
+        now = datetime.now()
+        self.users = [f"advisor_user_{i}" for i in range(num_users)]
+        self.psychologists = [f"advisor_psy_{i}" for i in range(num_psychologists)]
+
+        def when():
+            return now - timedelta(seconds=rng.randint(0, days_back * 86400))
+
+        def chatbot_conversations():
+            for user_id in self.users:
+                for _ in range(rng.randint(5, 15)):
+                    timestamp = when()
+                    yield {
+                        "user_id": user_id, "user_type": "patient", "timestamp": timestamp,
+                        "messages": [{"role": "user", "content": "Me siento ansioso hoy", "timestamp": timestamp}],
+                        "session_duration_minutes": rng.randint(5, 25),
+                        "satisfaction_rating": rng.randint(1, 10),
+                    }
+
+        def session_analysis():
+            for user_id in self.users:
+                psychologist_id = rng.choice(self.psychologists)
+                for i in range(rng.randint(3, 8)):
+                    session_date = when()
+                    yield {
+                        "patient_id": user_id, "psychologist_id": psychologist_id,
+                        "session_id": f"{user_id}_{i}", "session_date": session_date,
+                        "analysis": {
+                            "sentiment_score": round(rng.uniform(-1, 1), 3),
+                            "key_topics": [], "emotional_indicators": [],
+                            "progress_indicators": [], "risk_factors": [],
+                        },
+                        "created_at": session_date,
+                    }
+
+        def ml_predictions():
+            for user_id in self.users:
+                for _ in range(rng.randint(10, 30)):
+                    prediction_date = when()
+                    yield {
+                        "user_id": user_id, "prediction_date": prediction_date,
+                        "prediction_type": rng.choice(PREDICTION_TYPES),
+                        "input_features": {}, "prediction_result": {},
+                        "confidence_score": round(rng.random(), 3), "model_version": "1.0",
+                        "created_at": prediction_date,
+                    }
+
+        def system_metrics():
+            for minute in range(0, days_back * 1440, 5):
+                yield {
+                    "timestamp": now - timedelta(minutes=minute),
+                    "active_users": rng.randint(50, 500),
+                    "response_time_ms": rng.uniform(50, 300),
+                    "error_rate": rng.uniform(0, 0.05),
+                }
+
+        def activity_logs():
+            for user_id in self.users:
+                for _ in range(rng.randint(20, 80)):
+                    yield {
+                        "user_id": user_id, "user_type": "patient",
+                        "action": rng.choice(ACTIVITY_ACTIONS), "details": {}, "timestamp": when(),
+                    }
+
+        sources = {
+            "chatbot_conversations": chatbot_conversations(),
+            "session_analysis": session_analysis(),
+            "ml_predictions": ml_predictions(),
+            "system_metrics": system_metrics(),
+            "activity_logs": activity_logs(),
+        }
+        counts = {}
+        for name, documents in sources.items():
+            counts[name] = self._insert(name, documents)
+            print(f"  - {name}: {counts[name]} documentos")
+        return counts
+
+    def _params(self):
+        return {
+            "user_id": self.rng.choice(self.users),
+            "patient_id": self.rng.choice(self.users),
+            "psychologist_id": self.rng.choice(self.psychologists),
+            "prediction_type": self.rng.choice(PREDICTION_TYPES),
+            "since": datetime.now() - timedelta(days=7),
+        }
+
+    def _command(self, shape, params):
+        if shape.pipeline:
+            return {"aggregate": shape.collection, "pipeline": shape.pipeline(params), "cursor": {}}
+        command = {"find": shape.collection, "filter": shape.filter(params)}
+        if shape.sort:
+            command["sort"] = dict(shape.sort)
+        if shape.limit:
+            command["limit"] = shape.limit
+        return command
+
+    def _execute(self, shape, params):
+        collection = self.db[shape.collection]
+        if shape.pipeline:
+            return list(collection.aggregate(shape.pipeline(params)))
+        cursor = collection.find(shape.filter(params))
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        if shape.limit:
+            cursor = cursor.limit(shape.limit)
+        return list(cursor)
+
+    def measure(self, shape):
+        """explain (executionStats) más latencias p50/p95 con parámetros muestreados"""
+        params = self._params()
+        explain = self.db.command({"explain": self._command(shape, params), "verbosity": "executionStats"})
+        summary = summarize_explain(explain)
+        latencies = []
+        for _ in range(self.repeats):
+            params = self._params()
+            start = time.perf_counter()
+            self._execute(shape, params)
+            latencies.append((time.perf_counter() - start) * 1000)
+        p50, p95 = np.percentile(latencies, [50, 95])
+        summary.update({"p50_ms": float(p50), "p95_ms": float(p95)})
+        return summary
+
+    def needs_index(self, summary):
+        examined = max(summary["keys_examined"], summary["docs_examined"])
+        return summary["collscan"] or summary["in_memory_sort"] or examined > 4 * max(summary["returned"], 1)
+
+    def advise(self, apply=False):
+        """Mide cada forma de consulta y propone (o crea) los índices que faltan"""
+        report = []
+        for shape in QUERY_SHAPES:
+            before = self.measure(shape)
+            entry = {"query": shape.name, "collection": shape.collection, "before": before}
+            recommendation = recommend_index(shape, self._params())
+            existing = self.db[shape.collection].index_information().values()
+            covered = recommendation and any(
+                _index_covers(info["key"], recommendation[0])
+                and info.get("partialFilterExpression") == recommendation[1].get("partialFilterExpression")
+                for info in existing
+            )
+            if recommendation and not covered and self.needs_index(before):
+                keys, options = recommendation
+                entry["proposed_index"] = {"keys": keys, **options}
+                if apply:
+                    self.db[shape.collection].create_index(keys, **options)
+                    entry["after"] = self.measure(shape)
+            report.append(entry)
+            self._print(entry)
+        return report
+
+    def _print(self, entry):
+        before = entry["before"]
+        print(
+            f"  {entry['query']}: {before['docs_examined']} docs / {before['keys_examined']} claves "
+            f"examinadas, {before['returned']} devueltos, p50 {before['p50_ms']:.2f} ms "
+            f"[{', '.join(before['indexes']) or 'sin índice'}{', SORT en memoria' if before['in_memory_sort'] else ''}]"
+        )
+        if "proposed_index" in entry:
+            proposed = entry["proposed_index"]
+            keys = ", ".join(f"{field}: {direction}" for field, direction in proposed["keys"])
+            partial = f" parcial {proposed['partialFilterExpression']}" if "partialFilterExpression" in proposed else ""
+            print(f"    -> índice propuesto {{{keys}}}{partial}")
+        if "after" in entry:
+            after = entry["after"]
+            print(
+                f"    después: {after['docs_examined']} docs examinados, "
+                f"p50 {before['p50_ms']:.2f} -> {after['p50_ms']:.2f} ms"
+            )
+
+
+def main():
+    """Función principal para el asesor de índices de MongoDB"""
+    advisor = IndexAdvisor()
+
+    print("=== ASESOR DE ÍNDICES DE MONGODB ===\n")
+
+    advisor.seed(num_users=2000)
+
+    print("\nFormas de consulta:")
+    advisor.advise(apply=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import random
+import threading
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from ml_predictions import MentalHealthPredictor
+
+# Proporción de cada tipo de solicitud de /api/ml-prediction
+PAYLOAD_MIX = {
+    "risk_level": 0.5,
+    "mood_forecast": 0.3,
+    "intervention_recommendation": 0.2,
+}
+
+# Bordes del histograma de latencia en milisegundos
+LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def generate_payloads(num_requests, mix=None, seed=42):
+    """Genera cuerpos de solicitud realistas para /api/ml-prediction"""
+    mix = mix or PAYLOAD_MIX
+    rng = random.Random(seed)
+    types, weights = zip(*mix.items())
+    payloads = []
+    for i in range(num_requests):
+        mood_score = round(min(10, max(1, rng.gauss(6, 1.8))), 1)
+        anxiety_level = round(min(10, max(1, rng.gauss(5, 2))), 1)
+        payloads.append({
+            "user_id": f"load_patient_{i % 1000}",
+            "prediction_type": rng.choices(types, weights)[0],
+            "input_features": {
+                "age": rng.randint(18, 70),
+                "mood_score": mood_score,
+                "anxiety_level": anxiety_level,
+                "sleep_hours": round(min(12, max(4, rng.gauss(7.5, 1.5))), 1),
+                "exercise_minutes": rng.randint(0, 60),
+                "social_interaction": int(rng.random() < 0.6),
+                "on_medication": int(rng.random() < 0.3),
+                "therapy_sessions_week": rng.choice([0, 0, 1, 1, 2]),
+                "mood_trend": round(min(10, max(1, mood_score + rng.gauss(0, 0.8))), 1),
+                "anxiety_trend": round(min(10, max(1, anxiety_level + rng.gauss(0, 0.8))), 1),
+                "weekday": rng.randint(0, 6),
+                "day_of_year": rng.randint(1, 365),
+                "gender_encoded": rng.randint(0, 2),
+            },
+        })
+    return payloads
+
+
+class InProcessTarget:
+    """Atiende solicitudes con MentalHealthPredictor, igual que lo haría la ruta de la API"""
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+
+    def __call__(self, payload):
+        features = payload["input_features"]
+        prediction_type = payload["prediction_type"]
+        if prediction_type == "risk_level":
+            risk_level, probabilities = self.predictor.predict_patient_risk(features)
+            return {"risk_level": risk_level, "probability": float(probabilities[risk_level])}
+        if prediction_type == "mood_forecast":
+            predicted_mood = self.predictor.predict_future_mood(features)
+            return {
+                "predicted_mood": predicted_mood,
+                "trend": "improving" if predicted_mood > features["mood_score"] else "declining",
+            }
+        if prediction_type == "intervention_recommendation":
+            risk_level, _ = self.predictor.predict_patient_risk(features)
+            predicted_mood = self.predictor.predict_future_mood(features)
+            recommendations = self.predictor.generate_recommendations(features, risk_level, predicted_mood)
+            return {"recommendations": recommendations}
+        raise ValueError("Tipo de predicción no válido")
+
+
+class HttpTarget:
+    """Envía las solicitudes por POST a un endpoint local (p. ej. /api/ml-prediction)"""
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, payload):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        # urlopen lanza HTTPError para respuestas 4xx/5xx
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class LoadGenerator:
+    """Generador de carga de lazo cerrado (concurrencia fija) o abierto (tasa fija)
+
+    Con `rate` las solicitudes se programan a intervalos regulares y la
+    latencia se mide desde el instante programado, así que una cola que se
+    acumula cuenta como latencia (sin omisión coordinada). Sin `rate`, cada
+    uno de los `concurrency` hilos envía la siguiente solicitud en cuanto
+    termina la anterior.
+    """
+
+    def __init__(self, target, concurrency=8, rate=None):
+        self.target = target
+        self.concurrency = concurrency
+        self.rate = rate
+
+    def _timed_call(self, payload, scheduled):
+        try:
+            self.target(payload)
+            error = None
+        except Exception as e:
+            error = type(e).__name__
+        return payload["prediction_type"], time.perf_counter() - scheduled, error
+
+    def run(self, payloads):
+        """Envía todas las solicitudes y devuelve [(tipo, latencia_s, error)]"""
+        results = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            if self.rate:
+                futures = []
+                for i, payload in enumerate(payloads):
+                    scheduled = start + i / self.rate
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    futures.append(pool.submit(self._timed_call, payload, scheduled))
+                results = [future.result() for future in futures]
+            else:
+                lock = threading.Lock()
+                iterator = iter(payloads)
+
+                def worker():
+                    while True:
+                        with lock:
+                            payload = next(iterator, None)
+                        if payload is None:
+                            return
+                        result = self._timed_call(payload, time.perf_counter())
+                        with lock:
+                            results.append(result)
+
+                for future in [pool.submit(worker) for _ in range(self.concurrency)]:
+                    future.result()
+        elapsed = time.perf_counter() - start
+        return results, elapsed
+
+
+def summarize(results, elapsed):
+    """Throughput, percentiles, histograma de latencia y tasa de errores"""
+    latencies_ms = np.array([latency for _, latency, _ in results]) * 1000
+    errors = Counter(error for _, _, error in results if error)
+
+    def stats(values):
+        if not len(values):
+            return {}
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {
+            "count": int(len(values)),
+            "mean_ms": float(values.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(values.max()),
+        }
+
+    counts, _ = np.histogram(latencies_ms, bins=[0, *LATENCY_BUCKETS_MS, np.inf])
+    types = np.array([prediction_type for prediction_type, _, _ in results])
+    return {
+        "requests": len(results),
+        "seconds": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed > 0 else 0.0,
+        "error_rate": sum(errors.values()) / len(results) if results else 0.0,
+        "errors": dict(errors),
+        "latency": stats(latencies_ms),
+        "latency_by_type": {t: stats(latencies_ms[types == t]) for t in sorted(set(types))},
+        "histogram_ms": [
+            {"le": edge, "count": int(count)}
+            for edge, count in zip([*LATENCY_BUCKETS_MS, "inf"], counts)
+        ],
+    }
+
+
+def run_load_test(target, scenarios, num_requests=2000, seed=42):
+    """Ejecuta varios escenarios [{'concurrency': n, 'rate': r}] con las mismas solicitudes"""
+    payloads = generate_payloads(num_requests, seed=seed)
+    report = []
+    for scenario in scenarios:
+        generator = LoadGenerator(target, **scenario)
+        results, elapsed = generator.run(payloads)
+        summary = {**scenario, **summarize(results, elapsed)}
+        latency = summary["latency"]
+        print(
+            f"  concurrencia={scenario.get('concurrency', 8)} tasa={scenario.get('rate') or '-'}: "
+            f"{summary['throughput_rps']:.0f} req/s, p50 {latency['p50_ms']:.1f} ms, "
+            f"p95 {latency['p95_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms, "
+            f"errores {summary['error_rate']:.1%}"
+        )
+        report.append(summary)
+    return report
+
+
+def main():
+    """Función principal para la prueba de carga del camino de predicción"""
+    url = os.getenv("ML_PREDICTION_URL")
+    if url:
+        target = HttpTarget(url)
+    else:
+        predictor = MentalHealthPredictor()
+        if not predictor.load_models():
+            raise SystemExit("No hay modelos entrenados: ejecuta ml_predictions.py antes de la prueba de carga")
+        target = InProcessTarget(predictor)
+
+    print("=== PRUEBA DE CARGA DE PREDICCIONES ===\n")
+    print(f"Destino: {url or 'MentalHealthPredictor en proceso'}")
+
+    scenarios = [
+        {"concurrency": 1},
+        {"concurrency": 4},
+        {"concurrency": 8},
+        {"concurrency": 8, "rate": 100},
+    ]
+    report = run_load_test(target, scenarios)
+
+    with open('load_test_report.json', 'w') as f:
+        json.dump({"target": url or "in-process", "scenarios": report}, f, indent=2)
+
+    print(f"\nReporte guardado en 'load_test_report.json'")
+
+if __name__ == "__main__":
+    main()
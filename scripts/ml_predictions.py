@@ -1,24 +1,40 @@
+import argparse
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor, GradientBoostingRegressor
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import classification_report, mean_squared_error, r2_score
 import joblib
 from datetime import datetime, timedelta
 import json
+import time
 import warnings
+from patient_tensor import PatientDayTensor
+from model_cache import ModelCache
+from feature_schema import PATIENT_FEATURES
 warnings.filterwarnings('ignore')
 
 class MentalHealthPredictor:
-    def __init__(self):
+    def __init__(self, cache_dir=None):
         self.risk_classifier = None
         self.mood_predictor = None
+        self.mood_forecaster = None
+        self.forecast_horizons = None
         self.scaler = StandardScaler()
         self.label_encoder = LabelEncoder()
-        
-    def load_data(self):
-        """Carga y prepara los datos para el entrenamiento"""
+        # Caché opcional de modelos entrenados (se omite el reentrenamiento si nada cambió)
+        self.cache = ModelCache(cache_dir) if cache_dir else None
+        
+    def load_data(self, dense=False, drop_future=True):
+        """Carga y prepara los datos para el entrenamiento
+        
+        Con dense=True las tendencias y el objetivo futuro se calculan sobre un
+        PatientDayTensor (sumas acumuladas) en lugar de operaciones agrupadas.
+        Con drop_future=False se conservan los últimos 7 días de cada paciente
+        (future_mood queda en NaN), que build_horizon_targets necesita para
+        los objetivos de horizontes cortos.
+        """
         print("Cargando datos para entrenamiento de ML...")
         
         # Generar datos sintéticos más realistas
@@ -93,8 +109,14 @@ class MentalHealthPredictor:
         
         # Calcular tendencias (promedio móvil de 7 días)
         df = df.sort_values(['patient_id', 'date'])
-        df['mood_trend'] = df.groupby('patient_id')['mood_score'].rolling(window=7, min_periods=1).mean().reset_index(0, drop=True)
-        df['anxiety_trend'] = df.groupby('patient_id')['anxiety_level'].rolling(window=7, min_periods=1).mean().reset_index(0, drop=True)
+        if dense:
+            tensor = PatientDayTensor.from_frame(df, ['mood_score', 'anxiety_level'])
+            patient_idx, day_idx = tensor.frame_index(df)
+            df['mood_trend'] = tensor.rolling_mean('mood_score', window=7)[patient_idx, day_idx]
+            df['anxiety_trend'] = tensor.rolling_mean('anxiety_level', window=7)[patient_idx, day_idx]
+        else:
+            df['mood_trend'] = df.groupby('patient_id')['mood_score'].rolling(window=7, min_periods=1).mean().reset_index(0, drop=True)
+            df['anxiety_trend'] = df.groupby('patient_id')['anxiety_level'].rolling(window=7, min_periods=1).mean().reset_index(0, drop=True)
         
         # Crear etiquetas de riesgo
         def calculate_risk_level(row):
@@ -137,11 +159,15 @@ class MentalHealthPredictor:
         df['risk_level'] = df.apply(calculate_risk_level, axis=1)
         
         # Crear variable objetivo para predicción de estado de ánimo futuro
-        df = df.sort_values(['patient_id', 'date'])
-        df['future_mood'] = df.groupby('patient_id')['mood_score'].shift(-7)  # Estado de ánimo en 7 días
+        if dense:
+            df['future_mood'] = tensor.lagged('mood_score', 7)[patient_idx, day_idx]
+        else:
+            df = df.sort_values(['patient_id', 'date'])
+            df['future_mood'] = df.groupby('patient_id')['mood_score'].shift(-7)  # Estado de ánimo en 7 días
         
         # Eliminar filas sin datos futuros
-        df = df.dropna(subset=['future_mood'])
+        if drop_future:
+            df = df.dropna(subset=['future_mood'])
         
         print(f"Datos cargados: {len(df)} registros de {df['patient_id'].nunique()} pacientes")
         return df
@@ -150,20 +176,36 @@ class MentalHealthPredictor:
         """Entrena el clasificador de niveles de riesgo"""
         print("Entrenando clasificador de riesgo...")
         
-        # Preparar características
-        feature_columns = [
-            'age', 'mood_score', 'anxiety_level', 'sleep_hours', 
-            'exercise_minutes', 'social_interaction', 'on_medication',
-            'therapy_sessions_week', 'mood_trend', 'anxiety_trend',
-            'weekday', 'day_of_year'
-        ]
-        
         # Codificar género
         df['gender_encoded'] = self.label_encoder.fit_transform(df['gender'])
-        feature_columns.append('gender_encoded')
         
-        X = df[feature_columns]
-        y = df['risk_level']
+        # Preparar características
+        feature_columns = PATIENT_FEATURES.names
+        X = PATIENT_FEATURES.assemble(df)
+        y = df['risk_level'].to_numpy()
+        
+        risk_classifier = RandomForestClassifier(
+            n_estimators=200,
+            max_depth=10,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=42
+        )
+        
+        # Consultar la caché antes de entrenar
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.make_key(
+                X, y, feature_columns, risk_classifier.get_params(),
+                extra={'test_size': 0.2, 'random_state': 42, 'cv': 5}
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.risk_classifier = cached['model']
+                self.scaler = cached['scaler']
+                print(f"Clasificador recuperado de caché ({cache_key[:12]})")
+                print(f"Precisión en test: {cached['accuracy']:.3f}")
+                return cached['accuracy'], cached['feature_importance']
         
         # Dividir datos
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
@@ -173,14 +215,7 @@ class MentalHealthPredictor:
         X_test_scaled = self.scaler.transform(X_test)
         
         # Entrenar modelo
-        self.risk_classifier = RandomForestClassifier(
-            n_estimators=200,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42
-        )
-        
+        self.risk_classifier = risk_classifier
         self.risk_classifier.fit(X_train_scaled, y_train)
         
         # Evaluar modelo
@@ -207,6 +242,14 @@ class MentalHealthPredictor:
         for _, row in feature_importance.head().iterrows():
             print(f"  {row['feature']}: {row['importance']:.3f}")
         
+        if self.cache:
+            self.cache.put(cache_key, {
+                'model': self.risk_classifier,
+                'scaler': self.scaler,
+                'accuracy': accuracy,
+                'feature_importance': feature_importance,
+            })
+        
         return accuracy, feature_importance
     
     def train_mood_predictor(self, df):
@@ -214,15 +257,38 @@ class MentalHealthPredictor:
         print("\nEntrenando predictor de estado de ánimo...")
         
         # Preparar características (mismas que el clasificador)
-        feature_columns = [
-            'age', 'mood_score', 'anxiety_level', 'sleep_hours', 
-            'exercise_minutes', 'social_interaction', 'on_medication',
-            'therapy_sessions_week', 'mood_trend', 'anxiety_trend',
-            'weekday', 'day_of_year', 'gender_encoded'
-        ]
+        feature_columns = PATIENT_FEATURES.names
+        X = PATIENT_FEATURES.assemble(df)
+        y = df['future_mood'].to_numpy()
+        
+        mood_predictor = GradientBoostingRegressor(
+            n_estimators=200,
+            learning_rate=0.1,
+            max_depth=6,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=42
+        )
         
-        X = df[feature_columns]
-        y = df['future_mood']
+        # Consultar la caché; el estado del scaler compartido forma parte de la clave
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.make_key(
+                X, y, feature_columns, mood_predictor.get_params(),
+                extra={
+                    'test_size': 0.2,
+                    'random_state': 42,
+                    'scaler_mean': self.scaler.mean_.tolist(),
+                    'scaler_scale': self.scaler.scale_.tolist(),
+                }
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.mood_predictor = cached['model']
+                print(f"Predictor recuperado de caché ({cache_key[:12]})")
+                print(f"Error cuadrático medio: {cached['mse']:.3f}")
+                print(f"R² Score: {cached['r2']:.3f}")
+                return cached['mse'], cached['r2']
         
         # Dividir datos
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -232,15 +298,7 @@ class MentalHealthPredictor:
         X_test_scaled = self.scaler.transform(X_test)
         
         # Entrenar modelo
-        self.mood_predictor = GradientBoostingRegressor(
-            n_estimators=200,
-            learning_rate=0.1,
-            max_depth=6,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42
-        )
-        
+        self.mood_predictor = mood_predictor
         self.mood_predictor.fit(X_train_scaled, y_train)
         
         # Evaluar modelo
@@ -252,29 +310,159 @@ class MentalHealthPredictor:
         print(f"R² Score: {r2:.3f}")
         print(f"Error promedio: {np.sqrt(mse):.3f} puntos en escala 1-10")
         
+        if self.cache:
+            self.cache.put(cache_key, {'model': self.mood_predictor, 'mse': mse, 'r2': r2})
+        
         return mse, r2
     
+    def fast_learning_curve(self, df, target='risk_level', fractions=(0.01, 0.05, 0.25, 1.0),
+                            tolerance=0.005, quality_target=None):
+        """Modo de iteración rápida: entrena sobre submuestras estratificadas crecientes
+        
+        Evalúa cada tamaño contra un mismo conjunto de prueba (sin validación
+        cruzada) y se detiene cuando la métrica deja de mejorar más de
+        `tolerance` o alcanza `quality_target`. No modifica los modelos, el
+        scaler ni el codificador del predictor, ni el DataFrame recibido.
+        """
+        print(f"\nCurva de aprendizaje rápida ({target})...")
+        
+        if 'gender_encoded' not in df:
+            df = df.copy()
+            df['gender_encoded'] = LabelEncoder().fit_transform(df['gender'])
+        
+        is_classifier = target == 'risk_level'
+        metric = 'accuracy' if is_classifier else 'mse'
+        X = PATIENT_FEATURES.assemble(df)
+        y = df[target].to_numpy()
+        # Estratificar por clase de riesgo también para el objetivo de regresión
+        strata = df['risk_level'].to_numpy()
+        
+        X_pool, X_test, y_pool, y_test, strata_pool, _ = train_test_split(
+            X, y, strata, test_size=0.2, random_state=42, stratify=strata
+        )
+        
+        steps = []
+        for fraction in fractions:
+            if fraction < 1.0:
+                X_train, _, y_train, _ = train_test_split(
+                    X_pool, y_pool, train_size=fraction, random_state=42, stratify=strata_pool
+                )
+            else:
+                X_train, y_train = X_pool, y_pool
+            
+            scaler = StandardScaler().fit(X_train)
+            if is_classifier:
+                model = RandomForestClassifier(
+                    n_estimators=200, max_depth=10, min_samples_split=5,
+                    min_samples_leaf=2, random_state=42
+                )
+            else:
+                model = GradientBoostingRegressor(
+                    n_estimators=200, learning_rate=0.1, max_depth=6,
+                    min_samples_split=5, min_samples_leaf=2, random_state=42
+                )
+            
+            start = time.perf_counter()
+            model.fit(scaler.transform(X_train), y_train)
+            fit_seconds = time.perf_counter() - start
+            
+            y_pred = model.predict(scaler.transform(X_test))
+            if is_classifier:
+                score = float((y_pred == y_test).mean())
+            else:
+                score = float(mean_squared_error(y_test, y_pred))
+            
+            steps.append({
+                'fraction': fraction,
+                'train_rows': len(X_train),
+                metric: score,
+                'fit_seconds': fit_seconds,
+            })
+            print(f"  {fraction:>6.0%} ({len(X_train)} filas): {'precisión' if is_classifier else 'MSE'} "
+                  f"{score:.3f} en {fit_seconds:.2f}s")
+            
+            # Mejora: mayor precisión o menor MSE
+            if quality_target is not None and (score >= quality_target if is_classifier else score <= quality_target):
+                print(f"Objetivo de calidad alcanzado con {fraction:.0%} de los datos")
+                break
+            if len(steps) > 1:
+                previous = steps[-2][metric]
+                gain = score - previous if is_classifier else previous - score
+                if gain < tolerance:
+                    print(f"Métrica estabilizada (mejora {gain:.4f} < {tolerance}); deteniendo")
+                    break
+        
+        return pd.DataFrame(steps)
+    
+    def build_horizon_targets(self, df, horizons=range(1, 15)):
+        """Construye los objetivos de ánimo a 1..H días en una sola pasada vectorizada
+        
+        Devuelve una matriz (filas × horizontes) con NaN donde no existe el
+        registro del mismo paciente exactamente h días después. `df` debe
+        venir de load_data(drop_future=False): sin los últimos 7 días, los
+        objetivos de 1-7 días de las filas cercanas al final se pierden.
+        """
+        horizons = np.asarray(list(horizons))
+        df = df.sort_values(['patient_id', 'date'])
+        max_h = horizons.max()
+        
+        mood = np.concatenate([df['mood_score'].to_numpy(dtype=float), np.full(max_h, np.nan)])
+        patient = np.concatenate([df['patient_id'].to_numpy(), np.full(max_h, -1)])
+        day = np.concatenate([pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]').astype(np.int64), np.zeros(max_h, dtype=np.int64)])
+        
+        # Ventanas deslizantes: columna h = fila desplazada h posiciones
+        mood_w = np.lib.stride_tricks.sliding_window_view(mood, max_h + 1)[:, horizons]
+        patient_w = np.lib.stride_tricks.sliding_window_view(patient, max_h + 1)
+        day_w = np.lib.stride_tricks.sliding_window_view(day, max_h + 1)
+        
+        valid = (patient_w[:, horizons] == patient_w[:, [0]]) & (day_w[:, horizons] - day_w[:, [0]] == horizons)
+        targets = np.where(valid, mood_w, np.nan)
+        return df, targets
+    
+    def train_mood_forecaster(self, df, horizons=range(1, 15)):
+        """Entrena un predictor multi-salida del ánimo para varios horizontes a la vez"""
+        print("\nEntrenando pronosticador multi-horizonte de estado de ánimo...")
+        
+        df, targets = self.build_horizon_targets(df, horizons)
+        complete = ~np.isnan(targets).any(axis=1)
+        X = PATIENT_FEATURES.assemble(df)[complete]
+        y = targets[complete]
+        
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        
+        # Usar el mismo scaler (ya entrenado)
+        X_train_scaled = self.scaler.transform(X_train)
+        X_test_scaled = self.scaler.transform(X_test)
+        
+        # Un solo bosque con salida múltiple: los árboles se comparten entre horizontes
+        self.mood_forecaster = RandomForestRegressor(
+            n_estimators=100,
+            max_depth=10,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=42
+        )
+        self.mood_forecaster.fit(X_train_scaled, y_train)
+        self.forecast_horizons = list(horizons)
+        
+        y_pred = self.mood_forecaster.predict(X_test_scaled)
+        mse_by_horizon = {
+            h: float(mean_squared_error(y_test[:, i], y_pred[:, i]))
+            for i, h in enumerate(self.forecast_horizons)
+        }
+        
+        print(f"Horizontes entrenados: {self.forecast_horizons[0]}-{self.forecast_horizons[-1]} días")
+        print(f"Error cuadrático medio (promedio): {np.mean(list(mse_by_horizon.values())):.3f}")
+        
+        return mse_by_horizon
+    
     def predict_patient_risk(self, patient_data):
         """Predice el nivel de riesgo para un paciente"""
         if self.risk_classifier is None:
             raise ValueError("El modelo de riesgo no ha sido entrenado")
         
-        # Preparar datos
-        features = np.array([
-            patient_data['age'],
-            patient_data['mood_score'],
-            patient_data['anxiety_level'],
-            patient_data['sleep_hours'],
-            patient_data['exercise_minutes'],
-            patient_data['social_interaction'],
-            patient_data['on_medication'],
-            patient_data['therapy_sessions_week'],
-            patient_data['mood_trend'],
-            patient_data['anxiety_trend'],
-            patient_data['weekday'],
-            patient_data['day_of_year'],
-            patient_data['gender_encoded']
-        ]).reshape(1, -1)
+        # Ensamblar y validar características en el orden del esquema
+        features = PATIENT_FEATURES.assemble(patient_data)
         
         # Escalar y predecir
         features_scaled = self.scaler.transform(features)
@@ -292,22 +480,8 @@ class MentalHealthPredictor:
         if self.mood_predictor is None:
             raise ValueError("El modelo de predicción de ánimo no ha sido entrenado")
         
-        # Preparar datos (misma estructura que el clasificador)
-        features = np.array([
-            patient_data['age'],
-            patient_data['mood_score'],
-            patient_data['anxiety_level'],
-            patient_data['sleep_hours'],
-            patient_data['exercise_minutes'],
-            patient_data['social_interaction'],
-            patient_data['on_medication'],
-            patient_data['therapy_sessions_week'],
-            patient_data['mood_trend'],
-            patient_data['anxiety_trend'],
-            patient_data['weekday'],
-            patient_data['day_of_year'],
-            patient_data['gender_encoded']
-        ]).reshape(1, -1)
+        # Ensamblar y validar características en el orden del esquema
+        features = PATIENT_FEATURES.assemble(patient_data)
         
         # Escalar y predecir
         features_scaled = self.scaler.transform(features)
@@ -315,6 +489,19 @@ class MentalHealthPredictor:
         
         return round(mood_prediction, 1)
     
+    def predict_mood_curve(self, patient_data):
+        """Predice la curva de ánimo para todos los horizontes en una sola llamada"""
+        if self.mood_forecaster is None:
+            raise ValueError("El pronosticador multi-horizonte no ha sido entrenado")
+        
+        # Ensamblar y validar características en el orden del esquema
+        features = PATIENT_FEATURES.assemble(patient_data)
+        
+        features_scaled = self.scaler.transform(features)
+        curve = self.mood_forecaster.predict(features_scaled)[0]
+        
+        return {h: round(float(mood), 1) for h, mood in zip(self.forecast_horizons, curve)}
+    
     def generate_recommendations(self, patient_data, risk_level, future_mood):
         """Genera recomendaciones basadas en las predicciones"""
         recommendations = []
@@ -404,6 +591,8 @@ class MentalHealthPredictor:
             joblib.dump(self.scaler, 'feature_scaler.pkl')
         if self.label_encoder:
             joblib.dump(self.label_encoder, 'label_encoder.pkl')
+        if self.mood_forecaster:
+            joblib.dump((self.mood_forecaster, self.forecast_horizons), 'mood_forecaster_model.pkl')
         
         print("Modelos guardados exitosamente")
     
@@ -414,6 +603,10 @@ class MentalHealthPredictor:
             self.mood_predictor = joblib.load('mood_predictor_model.pkl')
             self.scaler = joblib.load('feature_scaler.pkl')
             self.label_encoder = joblib.load('label_encoder.pkl')
+            try:
+                self.mood_forecaster, self.forecast_horizons = joblib.load('mood_forecaster_model.pkl')
+            except FileNotFoundError:
+                pass  # El pronosticador multi-horizonte es opcional
             print("Modelos cargados exitosamente")
             return True
         except FileNotFoundError:
@@ -422,13 +615,23 @@ class MentalHealthPredictor:
 
 def main():
     """Función principal para entrenar y evaluar los modelos"""
-    predictor = MentalHealthPredictor()
+    parser = argparse.ArgumentParser(description="Entrenamiento de modelos de ML")
+    parser.add_argument("--fast", action="store_true",
+                        help="solo curvas de aprendizaje rápidas sobre submuestras, sin guardar modelos")
+    args = parser.parse_args()
+    
+    predictor = MentalHealthPredictor(cache_dir='model_cache')
     
     print("=== ENTRENAMIENTO DE MODELOS DE ML ===\n")
     
     # Cargar datos
     df = predictor.load_data()
     
+    if args.fast:
+        for target in ('risk_level', 'future_mood'):
+            predictor.fast_learning_curve(df, target=target)
+        return
+    
     # Entrenar modelos
     risk_accuracy, feature_importance = predictor.train_risk_classifier(df)
     mood_mse, mood_r2 = predictor.train_mood_predictor(df)
@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import sklearn
+import joblib
+
+
+class ModelCache:
+    """Caché de artefactos de entrenamiento direccionada por contenido.
+
+    La clave es un hash SHA-256 de los datos de entrenamiento, las columnas de
+    características, los parámetros del estimador y las versiones de las
+    librerías, así que cualquier cambio en alguno de ellos produce un fallo de
+    caché. Las entradas menos usadas se eliminan cuando el directorio supera
+    `max_bytes`.
+    """
+
+    def __init__(self, cache_dir='model_cache', max_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, X, y, feature_columns, params, extra=None):
+        """Calcula la clave de caché para un entrenamiento"""
+        digest = hashlib.sha256()
+        for data in (X, y):
+            if isinstance(data, (pd.DataFrame, pd.Series)):
+                digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+            else:
+                data = np.ascontiguousarray(data)
+                digest.update(str(data.dtype).encode())
+                digest.update(data.tobytes())
+        metadata = {
+            'feature_columns': list(feature_columns),
+            'params': params,
+            'extra': extra,
+            'versions': {
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'sklearn': sklearn.__version__,
+            },
+        }
+        digest.update(json.dumps(metadata, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Devuelve el artefacto guardado o None si no existe"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        artifact = joblib.load(path)
+        os.utime(path)  # Marcar como usado recientemente para la evicción
+        self.hits += 1
+        return artifact
+
+    def put(self, key, artifact):
+        """Guarda un artefacto de forma atómica y aplica la evicción por tamaño"""
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Elimina las entradas usadas hace más tiempo hasta quedar bajo max_bytes"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            evicted += 1
+        return evicted
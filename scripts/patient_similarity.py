@@ -0,0 +1,215 @@
+import time
+import numpy as np
+from sklearn.neighbors import KDTree
+from sklearn.preprocessing import StandardScaler
+from ml_predictions import MentalHealthPredictor
+from feature_schema import PATIENT_FEATURES, aggregate_patient_features
+
+# Características de calendario que no describen al paciente
+SIMILARITY_EXCLUDED = ('weekday', 'day_of_year')
+
+
+class PatientVectorizer:
+    """Vector de similitud de cada paciente
+
+    Une el último registro de cada paciente escalado con el scaler de
+    MentalHealthPredictor (sin las columnas de calendario) y los agregados
+    de su historial, estandarizados con un scaler propio ajustado en `fit`.
+    """
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self.columns = [j for j, name in enumerate(PATIENT_FEATURES.names) if name not in SIMILARITY_EXCLUDED]
+        self.aggregate_scaler = StandardScaler()
+
+    def _parts(self, df):
+        latest = df.sort_values('date').groupby('patient_id').tail(1).set_index('patient_id')
+        aggregates = aggregate_patient_features(df).loc[latest.index].fillna(0.0)
+        current = self.predictor.scaler.transform(PATIENT_FEATURES.assemble(latest))[:, self.columns]
+        return latest.index.tolist(), current, aggregates.to_numpy()
+
+    def fit_transform(self, df):
+        patient_ids, current, aggregates = self._parts(df)
+        aggregates = self.aggregate_scaler.fit_transform(aggregates)
+        return patient_ids, np.hstack([current, aggregates])
+
+    def transform(self, df):
+        """(ids, vectores) para pacientes nuevos o con registros actualizados"""
+        patient_ids, current, aggregates = self._parts(df)
+        return patient_ids, np.hstack([current, self.aggregate_scaler.transform(aggregates)])
+
+
+class PatientSimilarityIndex:
+    """Índice k-NN de pacientes con inserciones incrementales
+
+    Los vectores viven en un arreglo que crece por duplicación. Un KDTree
+    cubre las primeras `n_indexed` filas y las insertadas después quedan en
+    un búfer que se recorre por fuerza bruta; reinsertar un paciente marca
+    su fila anterior como borrada. Cuando el búfer o las filas borradas
+    superan `rebuild_ratio` del árbol, se compacta y se reconstruye, así que
+    cada consulta es un recorrido del árbol más un búfer acotado.
+    """
+
+    def __init__(self, leaf_size=40, rebuild_ratio=0.02, min_buffer=1024):
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.min_buffer = min_buffer
+        self.vectors = None
+        self.ids = []
+        self.rows = {}
+        self.deleted = np.zeros(0, dtype=bool)
+        self.n_rows = 0
+        self.n_indexed = 0
+        self.n_deleted_indexed = 0
+        self.tree = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _reserve(self, extra, dim):
+        if self.vectors is None:
+            self.vectors = np.empty((max(extra, 1024), dim))
+            self.deleted = np.zeros(len(self.vectors), dtype=bool)
+        elif self.n_rows + extra > len(self.vectors):
+            capacity = max(self.n_rows + extra, 2 * len(self.vectors))
+            vectors = np.empty((capacity, dim))
+            vectors[:self.n_rows] = self.vectors[:self.n_rows]
+            deleted = np.zeros(capacity, dtype=bool)
+            deleted[:self.n_rows] = self.deleted[:self.n_rows]
+            self.vectors, self.deleted = vectors, deleted
+
+    def _delete_row(self, row):
+        self.deleted[row] = True
+        if row < self.n_indexed:
+            self.n_deleted_indexed += 1
+
+    def add(self, patient_ids, vectors):
+        """Inserta o actualiza pacientes; reconstruye el árbol si hace falta"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=float))
+        self._reserve(len(vectors), vectors.shape[1])
+        for patient_id, vector in zip(patient_ids, vectors):
+            previous = self.rows.get(patient_id)
+            if previous is not None:
+                self._delete_row(previous)
+            self.vectors[self.n_rows] = vector
+            self.ids.append(patient_id)
+            self.rows[patient_id] = self.n_rows
+            self.n_rows += 1
+
+        threshold = max(self.min_buffer, self.rebuild_ratio * self.n_indexed)
+        if self.n_rows - self.n_indexed > threshold or self.n_deleted_indexed > threshold:
+            self.rebuild()
+
+    def remove(self, patient_id):
+        row = self.rows.pop(patient_id, None)
+        if row is not None:
+            self._delete_row(row)
+
+    def rebuild(self):
+        """Compacta las filas vivas y reconstruye el KDTree sobre todas ellas"""
+        alive = np.nonzero(~self.deleted[:self.n_rows])[0]
+        self.vectors[:len(alive)] = self.vectors[alive]
+        self.deleted[:] = False
+        self.ids = [self.ids[row] for row in alive]
+        self.rows = {patient_id: row for row, patient_id in enumerate(self.ids)}
+        self.n_rows = self.n_indexed = len(alive)
+        self.n_deleted_indexed = 0
+        self.tree = KDTree(self.vectors[:self.n_rows], leaf_size=self.leaf_size) if self.n_rows else None
+
+    def query(self, vector, k=10, exclude=None):
+        """Los `k` pacientes más cercanos como [(paciente, distancia)]"""
+        vector = np.asarray(vector, dtype=float).reshape(1, -1)
+        skip = self.rows.get(exclude, -1)
+        candidates_rows, candidates_dist = [], []
+        if self.tree is not None:
+            # Repetir con el doble de vecinos si las filas borradas dejan menos de `k`
+            fetch = k + (exclude is not None)
+            while True:
+                distances, rows = self.tree.query(vector, k=min(fetch, self.n_indexed))
+                keep = ~self.deleted[rows[0]] & (rows[0] != skip)
+                if keep.sum() >= k or fetch >= self.n_indexed:
+                    break
+                fetch *= 2
+            candidates_rows.append(rows[0][keep])
+            candidates_dist.append(distances[0][keep])
+        if self.n_rows > self.n_indexed:
+            diff = self.vectors[self.n_indexed:self.n_rows] - vector
+            distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+            distances[self.deleted[self.n_indexed:self.n_rows]] = np.inf
+            if skip >= self.n_indexed:
+                distances[skip - self.n_indexed] = np.inf
+            nearest = np.argpartition(distances, k)[:k] if len(distances) > k else np.arange(len(distances))
+            nearest = nearest[np.isfinite(distances[nearest])]
+            candidates_rows.append(self.n_indexed + nearest)
+            candidates_dist.append(distances[nearest])
+        if not candidates_rows:
+            return []
+
+        rows = np.concatenate(candidates_rows)
+        distances = np.concatenate(candidates_dist)
+        order = np.argsort(distances, kind='stable')[:k]
+        return [(self.ids[row], float(distance)) for row, distance in zip(rows[order], distances[order])]
+
+    def query_patient(self, patient_id, k=10):
+        """Pacientes más parecidos a uno ya indexado (sin incluirlo)"""
+        return self.query(self.vectors[self.rows[patient_id]], k, exclude=patient_id)
+
+
+def benchmark_queries(index, queries, k=10):
+    """Latencias de consulta (ms) una a una: media, p50 y p99"""
+    latencies = []
+    for vector in queries:
+        start = time.perf_counter()
+        index.query(vector, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {"mean_ms": float(np.mean(latencies)), "p50_ms": float(p50), "p99_ms": float(p99)}
+
+
+def main():
+    """Función principal para el índice de similitud de pacientes"""
+    predictor = MentalHealthPredictor()
+    if not predictor.load_models():
+        raise SystemExit("No hay modelos entrenados: ejecuta ml_predictions.py antes del índice de similitud")
+
+    print("=== ÍNDICE DE SIMILITUD DE PACIENTES ===\n")
+
+    df = predictor.load_data()
+    df['gender_encoded'] = predictor.label_encoder.transform(df['gender'])
+    vectorizer = PatientVectorizer(predictor)
+    patient_ids, vectors = vectorizer.fit_transform(df)
+
+    index = PatientSimilarityIndex()
+    index.add(patient_ids, vectors)
+    index.rebuild()
+    patient_id = patient_ids[0]
+    print(f"Pacientes similares a {patient_id}:")
+    for neighbor, distance in index.query_patient(patient_id, k=5):
+        print(f"  Paciente {neighbor}: distancia {distance:.3f}")
+
+    # Escala: 100k pacientes sintéticos alrededor de los reales
+    rng = np.random.default_rng(42)
+    n_synthetic = 100_000
+    synthetic = vectors[rng.integers(0, len(vectors), n_synthetic)] + rng.normal(0, 0.3, (n_synthetic, vectors.shape[1]))
+    large = PatientSimilarityIndex()
+    start = time.perf_counter()
+    large.add(np.arange(n_synthetic), synthetic)
+    large.rebuild()
+    print(f"\nÍndice de {len(large)} pacientes construido en {time.perf_counter() - start:.2f}s")
+
+    queries = synthetic[rng.integers(0, n_synthetic, 1000)]
+    stats = benchmark_queries(large, queries)
+    print(f"Consulta k=10: media {stats['mean_ms']:.3f} ms, p50 {stats['p50_ms']:.3f} ms, "
+          f"p99 {stats['p99_ms']:.3f} ms")
+
+    start = time.perf_counter()
+    new_vectors = synthetic[:5000] + rng.normal(0, 0.1, (5000, vectors.shape[1]))
+    for i, vector in enumerate(new_vectors):
+        large.add([n_synthetic + i], vector)
+    print(f"5000 inserciones incrementales en {time.perf_counter() - start:.2f}s "
+          f"({large.n_rows - large.n_indexed} en búfer)")
+    stats = benchmark_queries(large, queries)
+    print(f"Consulta k=10 con búfer: media {stats['mean_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms")
+
+if __name__ == "__main__":
+    main()
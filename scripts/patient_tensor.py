@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+
+class PatientDayTensor:
+    """Representación densa pacientes × días × métricas con máscara de faltantes.
+
+    Mantiene sumas acumuladas a lo largo del eje de días (valores, conteos y
+    valores ponderados por el índice del día), de modo que la media, la
+    tendencia lineal o el valor desplazado de cualquier ventana [start, end)
+    se obtienen en O(1) por paciente y en unas pocas operaciones de arrays
+    para toda la cohorte.
+    """
+
+    def __init__(self, values, mask, patient_ids, start_date, metrics):
+        self.values = values
+        self.mask = mask
+        self.patient_ids = np.asarray(patient_ids)
+        self.start_date = pd.Timestamp(start_date)
+        self.metrics = list(metrics)
+        self.metric_index = {m: i for i, m in enumerate(self.metrics)}
+        self._build_prefix_sums()
+
+    @classmethod
+    def from_frame(cls, df, metrics, patient_col='patient_id', date_col='date'):
+        """Construye el tensor desde un DataFrame en formato largo (un registro por paciente y día)"""
+        dates = pd.to_datetime(df[date_col]).dt.normalize()
+        start_date = dates.min()
+        day_idx = (dates - start_date).dt.days.to_numpy()
+        patient_ids, patient_idx = np.unique(df[patient_col].to_numpy(), return_inverse=True)
+        n_days = int(day_idx.max()) + 1
+
+        values = np.zeros((len(patient_ids), n_days, len(metrics)))
+        mask = np.zeros((len(patient_ids), n_days), dtype=bool)
+        values[patient_idx, day_idx] = df[metrics].to_numpy(dtype=float)
+        mask[patient_idx, day_idx] = True
+        return cls(values, mask, patient_ids, start_date, metrics)
+
+    def _build_prefix_sums(self):
+        n_patients, n_days, n_metrics = self.values.shape
+        days = np.arange(n_days, dtype=float)
+        masked = np.where(self.mask[:, :, None], self.values, 0.0)
+
+        # Prefijos con un cero inicial: suma en [start, end) = P[end] - P[start]
+        self.count_prefix = np.zeros((n_patients, n_days + 1))
+        self.count_prefix[:, 1:] = np.cumsum(self.mask, axis=1)
+        self.sum_prefix = np.zeros((n_patients, n_days + 1, n_metrics))
+        self.sum_prefix[:, 1:] = np.cumsum(masked, axis=1)
+        self.t_prefix = np.zeros((n_patients, n_days + 1))
+        self.t_prefix[:, 1:] = np.cumsum(self.mask * days, axis=1)
+        self.tt_prefix = np.zeros((n_patients, n_days + 1))
+        self.tt_prefix[:, 1:] = np.cumsum(self.mask * days ** 2, axis=1)
+        self.tx_prefix = np.zeros((n_patients, n_days + 1, n_metrics))
+        self.tx_prefix[:, 1:] = np.cumsum(masked * days[None, :, None], axis=1)
+
+    @property
+    def n_days(self):
+        return self.values.shape[1]
+
+    def day_index(self, date):
+        return (pd.Timestamp(date).normalize() - self.start_date).days
+
+    def _window(self, prefix, patients, start, end):
+        start = np.clip(start, 0, self.n_days)
+        end = np.clip(end, 0, self.n_days)
+        return prefix[patients, end] - prefix[patients, start]
+
+    def frame_index(self, df, patient_col='patient_id', date_col='date'):
+        """Índices (paciente, día) de cada fila de un DataFrame en formato largo"""
+        patient_idx = np.searchsorted(self.patient_ids, df[patient_col].to_numpy())
+        day_idx = (pd.to_datetime(df[date_col]).dt.normalize() - self.start_date).dt.days.to_numpy()
+        return patient_idx, day_idx
+
+    def window_counts(self, patients, start, end):
+        """Número de días con datos en [start, end) para cada paciente"""
+        return self._window(self.count_prefix, patients, start, end)
+
+    def window_sum(self, patients, start, end, metric):
+        """Suma de `metric` en [start, end); acepta escalares o arrays de índices"""
+        return self._window(self.sum_prefix[:, :, self.metric_index[metric]], patients, start, end)
+
+    def window_mean(self, patients, start, end, metric):
+        """Media de `metric` en [start, end); acepta escalares o arrays de índices"""
+        counts = self.window_counts(patients, start, end)
+        sums = self.window_sum(patients, start, end, metric)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def window_trend(self, patients, start, end, metric):
+        """Pendiente de mínimos cuadrados (unidades por día) de `metric` en [start, end)"""
+        m = self.metric_index[metric]
+        n = self.window_counts(patients, start, end)
+        st = self._window(self.t_prefix, patients, start, end)
+        stt = self._window(self.tt_prefix, patients, start, end)
+        sx = self._window(self.sum_prefix[:, :, m], patients, start, end)
+        stx = self._window(self.tx_prefix[:, :, m], patients, start, end)
+        denom = n * stt - st ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(denom > 0, (n * stx - st * sx) / denom, np.nan)
+
+    def rolling_mean(self, metric, window=7):
+        """Media móvil de los últimos `window` días para toda la cohorte (pacientes × días)"""
+        m = self.metric_index[metric]
+        ends = np.arange(1, self.n_days + 1)
+        starts = np.maximum(ends - window, 0)
+        counts = self.count_prefix[:, ends] - self.count_prefix[:, starts]
+        sums = self.sum_prefix[:, ends, m] - self.sum_prefix[:, starts, m]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def lagged(self, metric, lag):
+        """Valor de `metric` desplazado `lag` días (negativo = pasado); NaN si falta"""
+        m = self.metric_index[metric]
+        out = np.full(self.mask.shape, np.nan)
+        days = np.arange(self.n_days)
+        src = days + lag
+        valid = (src >= 0) & (src < self.n_days)
+        shifted = np.where(self.mask[:, src[valid]], self.values[:, src[valid], m], np.nan)
+        out[:, valid] = shifted
+        return out
+
+    def to_frame(self, features):
+        """Convierte arrays pacientes × días a formato largo (solo días con datos)"""
+        patient_idx, day_idx = np.nonzero(self.mask)
+        frame = pd.DataFrame({
+            'patient_id': self.patient_ids[patient_idx],
+            'date': (self.start_date + pd.to_timedelta(day_idx, unit='D')).date,
+        })
+        for name, array in features.items():
+            frame[name] = array[patient_idx, day_idx]
+        return frame
@@ -0,0 +1,209 @@
+import heapq
+import time
+from ml_predictions import MentalHealthPredictor
+from feature_schema import PATIENT_FEATURES
+
+# Peso de cada clase en el puntaje de riesgo esperado
+RISK_WEIGHTS = {"low": 0.0, "medium": 0.5, "high": 1.0}
+
+
+def risk_score(probabilities):
+    """Riesgo esperado a partir de las probabilidades de predict_patient_risk"""
+    return float(sum(RISK_WEIGHTS[level] * p for level, p in probabilities.items()))
+
+
+class TopKHeap:
+    """Top-K por puntaje con actualizaciones incrementales
+
+    `top` es un min-heap con los K mejores (su raíz es el peor del top) y
+    `rest` un max-heap con los demás. Una actualización invalida las
+    entradas viejas del paciente (borrado perezoso por versión) y empuja una
+    nueva; después se intercambian raíces hasta que el peor del top supere
+    al mejor del resto. Las consultas solo leen `top`.
+    """
+
+    def __init__(self, k=10):
+        self.k = k
+        self.scores = {}
+        self.in_top = set()
+        self.top = []
+        self.rest = []
+        self._version = 0
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _valid(self, entry, in_top):
+        _, version, patient_id = entry
+        current = self.scores.get(patient_id)
+        return current is not None and current[1] == version and (patient_id in self.in_top) == in_top
+
+    def _clean(self):
+        while self.top and not self._valid(self.top[0], True):
+            heapq.heappop(self.top)
+        while self.rest and not self._valid(self.rest[0], False):
+            heapq.heappop(self.rest)
+
+    def _promote(self):
+        _, version, patient_id = heapq.heappop(self.rest)
+        self.in_top.add(patient_id)
+        heapq.heappush(self.top, (self.scores[patient_id][0], version, patient_id))
+
+    def _demote(self):
+        score, version, patient_id = heapq.heappop(self.top)
+        self.in_top.discard(patient_id)
+        heapq.heappush(self.rest, (-score, version, patient_id))
+
+    def _rebalance(self):
+        while True:
+            self._clean()
+            if len(self.in_top) < self.k and self.rest:
+                self._promote()
+            elif len(self.in_top) > self.k:
+                self._demote()
+            elif self.top and self.rest and -self.rest[0][0] > self.top[0][0]:
+                self._demote()
+                self._clean()
+                self._promote()
+            else:
+                break
+        # Compactar cuando las entradas obsoletas dominan los heaps
+        if len(self.top) + len(self.rest) > 4 * len(self.scores) + 64:
+            self.top = [e for e in self.top if self._valid(e, True)]
+            self.rest = [e for e in self.rest if self._valid(e, False)]
+            heapq.heapify(self.top)
+            heapq.heapify(self.rest)
+
+    def update(self, patient_id, score):
+        self._version += 1
+        self.scores[patient_id] = (score, self._version)
+        if patient_id in self.in_top and self.top and score >= self.top[0][0]:
+            # Sigue en el top: solo se toca el heap de tamaño K
+            heapq.heappush(self.top, (score, self._version, patient_id))
+        else:
+            self.in_top.discard(patient_id)
+            heapq.heappush(self.rest, (-score, self._version, patient_id))
+        self._rebalance()
+
+    def remove(self, patient_id):
+        if self.scores.pop(patient_id, None) is not None:
+            self.in_top.discard(patient_id)
+            self._rebalance()
+
+    def items(self):
+        """(paciente, puntaje) del top, de mayor a menor riesgo"""
+        return sorted(((pid, self.scores[pid][0]) for pid in self.in_top), key=lambda item: -item[1])
+
+
+class RiskRanking:
+    """Pacientes de mayor riesgo por psicólogo y de toda la plataforma
+
+    Mantiene un TopKHeap global y uno por psicólogo asignado
+    (`patients.assigned_psychologist`). Cada cambio de puntaje o de
+    asignación actualiza solo los heaps afectados, y `top()` responde sin
+    recorrer ni re-puntuar a todos los pacientes.
+    """
+
+    def __init__(self, k=10):
+        self.k = k
+        self.global_top = TopKHeap(k)
+        self.by_psychologist = {}
+        self.assignments = {}
+        self.probabilities = {}
+
+    def _heap(self, psychologist_id):
+        if psychologist_id not in self.by_psychologist:
+            self.by_psychologist[psychologist_id] = TopKHeap(self.k)
+        return self.by_psychologist[psychologist_id]
+
+    def assign(self, patient_id, psychologist_id):
+        """Registra o cambia el psicólogo asignado de un paciente"""
+        previous = self.assignments.get(patient_id)
+        if previous == psychologist_id:
+            return
+        # Un paciente asignado pero aún sin puntuar no tiene montículo de psicólogo
+        if previous in self.by_psychologist:
+            self.by_psychologist[previous].remove(patient_id)
+        self.assignments[patient_id] = psychologist_id
+        if patient_id in self.probabilities and psychologist_id is not None:
+            self._heap(psychologist_id).update(patient_id, risk_score(self.probabilities[patient_id]))
+
+    def load_assignments(self, patients):
+        """Carga asignaciones desde filas de `patients` (id, assigned_psychologist)"""
+        for row in patients:
+            self.assign(row["id"], row.get("assigned_psychologist"))
+
+    def update(self, patient_id, probabilities, psychologist_id=None):
+        """Actualiza el riesgo de un paciente a partir de sus probabilidades por clase"""
+        if psychologist_id is not None:
+            self.assign(patient_id, psychologist_id)
+        self.probabilities[patient_id] = probabilities
+        score = risk_score(probabilities)
+        self.global_top.update(patient_id, score)
+        psychologist_id = self.assignments.get(patient_id)
+        if psychologist_id is not None:
+            self._heap(psychologist_id).update(patient_id, score)
+        return score
+
+    def score_patient(self, predictor, patient_id, patient_data, psychologist_id=None):
+        """Predice con predict_patient_risk y actualiza la clasificación"""
+        _, probabilities = predictor.predict_patient_risk(patient_data)
+        return self.update(patient_id, probabilities, psychologist_id)
+
+    def remove(self, patient_id):
+        """Quita a un paciente (alta, baja o reasignación fuera de la plataforma)"""
+        self.global_top.remove(patient_id)
+        psychologist_id = self.assignments.pop(patient_id, None)
+        if psychologist_id in self.by_psychologist:
+            self.by_psychologist[psychologist_id].remove(patient_id)
+        self.probabilities.pop(patient_id, None)
+
+    def top(self, psychologist_id=None, k=None):
+        """Top-K de un psicólogo, o de toda la plataforma si no se indica"""
+        heap = self.global_top if psychologist_id is None else self.by_psychologist.get(psychologist_id)
+        if heap is None:
+            return []
+        return [
+            {
+                "patient_id": patient_id,
+                "risk_score": score,
+                "risk_level": max(self.probabilities[patient_id], key=self.probabilities[patient_id].get),
+                "psychologist_id": self.assignments.get(patient_id),
+            }
+            for patient_id, score in heap.items()[:k or self.k]
+        ]
+
+
+def main():
+    """Función principal para la clasificación de pacientes de mayor riesgo"""
+    predictor = MentalHealthPredictor()
+    if not predictor.load_models():
+        raise SystemExit("No hay modelos entrenados: ejecuta ml_predictions.py antes de la clasificación de riesgo")
+    ranking = RiskRanking(k=5)
+
+    print("=== PACIENTES DE MAYOR RIESGO ===\n")
+
+    df = predictor.load_data()
+    df['gender_encoded'] = predictor.label_encoder.transform(df['gender'])
+    latest = df.sort_values('date').groupby('patient_id').tail(1)
+    records = latest[PATIENT_FEATURES.names].to_dict('records')
+    patient_ids = latest['patient_id'].tolist()
+    ranking.load_assignments({"id": pid, "assigned_psychologist": f"psy_{pid % 10}"} for pid in patient_ids)
+
+    start = time.perf_counter()
+    for patient_id, patient_data in zip(patient_ids, records):
+        ranking.score_patient(predictor, patient_id, patient_data)
+    elapsed = time.perf_counter() - start
+    print(f"{len(patient_ids)} pacientes puntuados en {elapsed:.2f}s")
+
+    print("\nTop 5 de la plataforma:")
+    for entry in ranking.top():
+        print(f"  Paciente {entry['patient_id']} ({entry['psychologist_id']}): "
+              f"{entry['risk_score']:.3f} [{entry['risk_level']}]")
+
+    print("\nTop 5 de psy_0:")
+    for entry in ranking.top("psy_0"):
+        print(f"  Paciente {entry['patient_id']}: {entry['risk_score']:.3f} [{entry['risk_level']}]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+import numpy as np
+from database_setup import DatabaseManager
+from ml_predictions import MentalHealthPredictor
+from feature_schema import PATIENT_FEATURES
+
+# Valores por defecto para características que no vienen en los registros de ánimo
+DEFAULT_PROFILE = {
+    "age": 35,
+    "on_medication": 0,
+    "therapy_sessions_week": 0,
+    "gender_encoded": 0,
+}
+
+
+# Campos opcionales de los registros de ánimo y su valor si faltan o son nulos
+LOG_DEFAULTS = {
+    "anxiety_level": 5,
+    "sleep_hours": 7.5,
+    "exercise_minutes": 0,
+}
+
+
+def log_value(doc, key):
+    """Valor de un campo del registro; el valor por defecto si falta o es nulo"""
+    value = doc.get(key)
+    return LOG_DEFAULTS[key] if value is None else value
+
+
+def log_error(doc):
+    """Motivo por el que un registro de ánimo no se puede puntuar, o None"""
+    if doc.get("patient_id") is None:
+        return "falta patient_id"
+    try:
+        datetime.fromisoformat(str(doc["log_date"]))
+    except (KeyError, ValueError):
+        return f"log_date inválido: {doc.get('log_date')!r}"
+    for key in ("mood_score", *LOG_DEFAULTS):
+        value = doc.get("mood_score") if key == "mood_score" else log_value(doc, key)
+        j = PATIENT_FEATURES.index[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+            return f"{key} no numérico: {value!r}"
+        if not PATIENT_FEATURES.low[j] <= value <= PATIENT_FEATURES.high[j]:
+            return f"{key}={value} fuera de rango"
+    return None
+
+
+class PatientState:
+    """Estado incremental de un paciente: últimos 7 días y valores más recientes
+
+    Los valores se guardan por `log_date`, así un registro re-enviado para
+    un día ya visto reemplaza al anterior en vez de contarse dos veces.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.days = {}
+        self.latest = None
+
+    def update(self, doc):
+        self.days[str(doc["log_date"])] = (doc["mood_score"], log_value(doc, "anxiety_level"))
+        if len(self.days) > 7:
+            del self.days[min(self.days)]
+        if self.latest is None or str(doc["log_date"]) >= str(self.latest["log_date"]):
+            self.latest = doc
+
+    def features(self):
+        doc = self.latest
+        log_date = datetime.fromisoformat(str(doc["log_date"]))
+        moods, anxieties = zip(*self.days.values())
+        return {
+            **self.profile,
+            "mood_score": doc["mood_score"],
+            "anxiety_level": log_value(doc, "anxiety_level"),
+            "sleep_hours": log_value(doc, "sleep_hours"),
+            "exercise_minutes": log_value(doc, "exercise_minutes"),
+            "social_interaction": int(bool(doc.get("social_interaction"))),
+            "mood_trend": float(np.mean(moods)),
+            "anxiety_trend": float(np.mean(anxieties)),
+            "weekday": log_date.weekday(),
+            "day_of_year": log_date.timetuple().tm_yday,
+        }
+
+
+class MoodScoringWorker:
+    """Sigue los registros de ánimo nuevos y re-puntúa solo a los pacientes afectados
+
+    Lee `mood_logs_sample` con un change stream de MongoDB (requiere replica
+    set) o, por defecto, sondeando por `updated_at` con desempate por `_id`
+    (bulk_upsert lo renueva cuando un registro cambia, así que el sondeo
+    también ve las correcciones). Con change stream, el token de reanudación
+    se guarda con la marca de agua y el stream continúa desde él al reiniciar.
+    Los documentos se agrupan en micro-lotes; cada lote actualiza el estado
+    de los pacientes afectados, los puntúa con una sola llamada a cada
+    modelo y escribe las predicciones en `ml_predictions`.
+    """
+
+    def __init__(self, db_manager=None, predictor=None, profiles=None,
+                 batch_size=500, poll_interval=1.0, model_version="1.0.0", ranking=None):
+        self.db_manager = db_manager or DatabaseManager()
+        self.db = self.db_manager.mongo_db
+        if predictor is None:
+            predictor = MentalHealthPredictor()
+            if not predictor.load_models():
+                raise ValueError("No hay modelos entrenados: ejecuta ml_predictions.py antes del worker")
+        if predictor.risk_classifier is None or predictor.mood_predictor is None:
+            raise ValueError("El predictor no tiene los modelos de riesgo y ánimo cargados")
+        self.predictor = predictor
+        self.profiles = profiles or {}
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.model_version = model_version
+        self.states = {}
+        # RiskRanking opcional: se actualiza con cada paciente re-puntuado
+        self.ranking = ranking
+        self.watermark = self.db["scoring_watermarks"].find_one({"_id": "mood_logs_sample"}) or {}
+        self.resume_token = None
+        self.metrics = defaultdict(float)
+
+    def _state(self, patient_id, log_date):
+        """Estado del paciente; la primera vez se carga con sus 7 registros anteriores a `log_date`
+
+        Así, tras un reinicio, las tendencias de 7 días no se calculan con
+        solo los registros que lleguen después.
+        """
+        if patient_id not in self.states:
+            profile = {**DEFAULT_PROFILE, **self.profiles.get(patient_id, {})}
+            state = self.states[patient_id] = PatientState(profile)
+            history = self.db["mood_logs_sample"].find(
+                {"patient_id": patient_id, "log_date": {"$lt": log_date}},
+                {"log_date": 1, "mood_score": 1, "anxiety_level": 1},
+            ).sort("log_date", -1).limit(7)
+            for doc in reversed(list(history)):
+                if log_error(doc) is None:
+                    state.days[str(doc["log_date"])] = (doc["mood_score"], log_value(doc, "anxiety_level"))
+        return self.states[patient_id]
+
+    def _dead_letter(self, entries, now):
+        """Aparta registros que no se pueden puntuar en `scoring_dead_letters`"""
+        if entries:
+            self.db["scoring_dead_letters"].insert_many([
+                {"source_id": doc.get("_id"), "patient_id": doc.get("patient_id"),
+                 "reason": reason, "document": doc, "created_at": now}
+                for doc, reason in entries
+            ], ordered=False)
+            self.metrics["dead_letters"] += len(entries)
+
+    def _poll(self):
+        """Siguiente micro-lote de documentos después de la marca de agua
+
+        Solo se leen documentos con `updated_at` de tipo fecha (los escritos
+        por bulk_upsert); MongoDB no compara fechas con otros tipos, así que
+        una marca de agua de otro tipo detendría el sondeo.
+        """
+        query = {"updated_at": {"$type": "date"}}
+        if isinstance(self.watermark.get("updated_at"), datetime):
+            query = {"$or": [
+                {"updated_at": {"$gt": self.watermark["updated_at"]}},
+                {"updated_at": self.watermark["updated_at"], "_id": {"$gt": self.watermark["last_id"]}},
+            ]}
+        cursor = self.db["mood_logs_sample"].find(query).sort(
+            [("updated_at", 1), ("_id", 1)]
+        ).limit(self.batch_size)
+        return list(cursor)
+
+    def process_batch(self, docs):
+        """Actualiza estados, re-puntúa pacientes afectados y guarda predicciones
+
+        Los registros inválidos (o los pacientes cuyas características quedan
+        fuera de rango) van a `scoring_dead_letters` y el resto del lote se
+        procesa; la marca de agua avanza siempre, así un documento dañado no
+        bloquea el worker.
+        """
+        if not docs:
+            return 0
+        start = time.perf_counter()
+        now = datetime.now()
+
+        rejected = []
+        latest_doc = {}
+        for doc in docs:
+            reason = log_error(doc)
+            if reason is not None:
+                rejected.append((doc, reason))
+                continue
+            self._state(doc["patient_id"], doc["log_date"]).update(doc)
+            latest_doc[doc["patient_id"]] = doc
+
+        affected = list(latest_doc)
+        rows = [self.states[pid].features() for pid in affected]
+        X = PATIENT_FEATURES.assemble(rows, validate=False) if rows else PATIENT_FEATURES.empty(0)
+        invalid = set(PATIENT_FEATURES.invalid_rows(X).tolist())
+        for i in sorted(invalid):
+            rejected.append((latest_doc[affected[i]], PATIENT_FEATURES.describe_row(X[i])))
+        keep = [i for i in range(len(affected)) if i not in invalid]
+        affected = [affected[i] for i in keep]
+        rows = [rows[i] for i in keep]
+        self._dead_letter(rejected, now)
+
+        if affected:
+            self._score(affected, rows, X[keep], now)
+
+        self._advance(docs)
+        self.metrics["documents"] += len(docs)
+        self.metrics["patients_scored"] += len(affected)
+        self.metrics["batches"] += 1
+        self.metrics["busy_seconds"] += time.perf_counter() - start
+
+        # Métricas: retraso desde la última escritura del documento hasta su puntuación
+        lags = [(now - datetime.fromisoformat(str(latest_doc[pid]["updated_at"]))).total_seconds()
+                for pid in affected if latest_doc[pid].get("updated_at")]
+        if lags:
+            self.metrics["max_lag_seconds"] = max(self.metrics["max_lag_seconds"], max(lags))
+            self.metrics["last_lag_seconds"] = lags[-1]
+        return len(docs)
+
+    def _score(self, affected, rows, X, now):
+        """Predice riesgo y ánimo futuro para los pacientes afectados y guarda las predicciones"""
+        X_scaled = self.predictor.scaler.transform(X)
+        probabilities = self.predictor.risk_classifier.predict_proba(X_scaled)
+        classes = self.predictor.risk_classifier.classes_
+        future_moods = self.predictor.mood_predictor.predict(X_scaled)
+
+        predictions = []
+        for pid, row, probs, future_mood in zip(affected, rows, probabilities, future_moods):
+            best = int(np.argmax(probs))
+            if self.ranking is not None:
+                self.ranking.update(
+                    pid,
+                    {c: float(p) for c, p in zip(classes, probs)},
+                    self.states[pid].profile.get("assigned_psychologist"),
+                )
+            predictions.append({
+                "user_id": pid,
+                "prediction_date": now,
+                "prediction_type": "risk_level",
+                "input_features": row,
+                "prediction_result": {
+                    "risk_level": classes[best],
+                    "probabilities": {c: float(p) for c, p in zip(classes, probs)},
+                },
+                "confidence_score": float(probs[best]),
+                "model_version": self.model_version,
+                "created_at": now,
+            })
+            predictions.append({
+                "user_id": pid,
+                "prediction_date": now,
+                "prediction_type": "mood_forecast",
+                "input_features": row,
+                "prediction_result": {
+                    "predicted_mood": round(float(future_mood), 1),
+                    "trend": "improving" if future_mood > row["mood_score"] else "declining",
+                },
+                "confidence_score": None,
+                "model_version": self.model_version,
+                "created_at": now,
+            })
+        self.db["ml_predictions"].insert_many(predictions, ordered=False)
+
+
+    def _advance(self, docs):
+        """Guarda la marca de agua después del último documento del lote con `updated_at`
+
+        Los documentos sin `updated_at` de tipo fecha (solo pueden llegar por
+        el change stream) no mueven la marca de agua del sondeo. Con change
+        stream se guarda también su token de reanudación.
+        """
+        dated = [doc for doc in docs if isinstance(doc.get("updated_at"), datetime)]
+        watermark = dict(self.watermark, _id="mood_logs_sample")
+        if dated:
+            watermark.update(updated_at=dated[-1]["updated_at"], last_id=dated[-1]["_id"])
+        if self.resume_token is not None:
+            watermark["resume_token"] = self.resume_token
+        self.watermark = watermark
+        self.db["scoring_watermarks"].replace_one({"_id": "mood_logs_sample"}, self.watermark, upsert=True)
+
+    def _change_stream_batches(self):
+        """Micro-lotes desde el change stream, reanudado desde el último token guardado"""
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        with self.db["mood_logs_sample"].watch(
+            pipeline, full_document="updateLookup", resume_after=self.watermark.get("resume_token")
+        ) as stream:
+            batch = []
+            deadline = time.monotonic() + self.poll_interval
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None and change.get("fullDocument") is not None:
+                    batch.append(change["fullDocument"])
+                if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                    # Token del último cambio del lote: se guarda con la marca de agua al procesarlo
+                    self.resume_token = stream.resume_token
+                    yield batch
+                    batch = []
+                    deadline = time.monotonic() + self.poll_interval
+                elif change is None and not batch:
+                    yield []
+
+    def _polling_batches(self):
+        while True:
+            yield self._poll()
+
+    def run(self, use_change_stream=False, max_idle_polls=None):
+        """Procesa micro-lotes hasta agotar `max_idle_polls` sondeos vacíos (None = siempre)"""
+        print(f"Iniciando worker de puntuación ({'change stream' if use_change_stream else 'sondeo'})...")
+        start = time.perf_counter()
+        idle = 0
+        batches = self._change_stream_batches() if use_change_stream else self._polling_batches()
+        for docs in batches:
+            if docs:
+                idle = 0
+                self.process_batch(docs)
+                self.report(time.perf_counter() - start)
+            else:
+                idle += 1
+                if max_idle_polls is not None and idle >= max_idle_polls:
+                    break
+                time.sleep(self.poll_interval)
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        """Resumen de throughput y retraso"""
+        m = self.metrics
+        stats = {
+            "documents": int(m["documents"]),
+            "patients_scored": int(m["patients_scored"]),
+            "batches": int(m["batches"]),
+            "dead_letters": int(m["dead_letters"]),
+            "docs_per_sec": m["documents"] / m["busy_seconds"] if m["busy_seconds"] else 0.0,
+            "last_lag_seconds": m["last_lag_seconds"],
+            "max_lag_seconds": m["max_lag_seconds"],
+            "elapsed_seconds": elapsed,
+        }
+        print(
+            f"  {stats['documents']} registros, {stats['patients_scored']} puntuaciones, "
+            f"{stats['dead_letters']} apartados, {stats['docs_per_sec']:.0f} docs/s, retraso {stats['last_lag_seconds']:.1f}s"
+        )
+        return stats
+
+
+def main():
+    """Función principal para el worker de puntuación incremental"""
+    worker = MoodScoringWorker()
+
+    print("=== INGESTA INCREMENTAL DE REGISTROS DE ÁNIMO ===\n")
+
+    worker.run(max_idle_polls=None)
+
+if __name__ == "__main__":
+    main()
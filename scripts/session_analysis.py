@@ -0,0 +1,245 @@
+import time
+import hashlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from pymongo import UpdateOne
+from database_setup import DatabaseManager, batched
+from conversation_index import TOKEN_PATTERN, SPANISH_STOPWORDS, normalize_text, stem
+
+# Cambiar al modificar los léxicos: invalida los análisis guardados
+ANALYZER_VERSION = "1"
+
+SENTIMENT_LEXICON = {
+    "mejor": 1.5, "mejora": 1.5, "avance": 1.5, "progreso": 1.5, "logro": 1.5, "logrados": 1.5,
+    "tranquilo": 1.0, "calma": 1.0, "esperanzado": 2.0, "confianza": 1.0, "motivado": 1.5,
+    "feliz": 2.0, "alegria": 2.0, "cumplio": 1.0, "apoyo": 0.5, "autoestima": 0.5,
+    "ansiedad": -1.5, "ansioso": -1.5, "tristeza": -2.0, "triste": -2.0, "desmotivacion": -1.5,
+    "preocupacion": -1.0, "panico": -2.0, "aislamiento": -1.5, "cansancio": -1.0,
+    "problemas": -1.0, "miedo": -1.5, "desesperanza": -3.0, "daño": -3.0, "llanto": -1.5,
+    "culpa": -1.5, "enojo": -1.5, "estres": -1.5, "insomnio": -1.5, "soledad": -1.5,
+}
+
+THEMES = {
+    "ansiedad": ["ansiedad", "ansioso", "panico", "nervios", "preocupacion"],
+    "sueño": ["dormir", "sueño", "insomnio", "cansancio"],
+    "trabajo": ["trabajo", "laboral", "jefe", "estudios"],
+    "familia": ["familia", "padres", "hijos", "hermanos"],
+    "relaciones": ["pareja", "ruptura", "amigos", "relacion"],
+    "economía": ["economicos", "dinero", "deudas"],
+    "autoestima": ["autoestima", "confianza", "inseguridad"],
+    "actividad física": ["ejercicio", "deporte", "caminar"],
+    "aislamiento": ["aislamiento", "soledad", "interes"],
+}
+
+EMOTIONAL_INDICATORS = {
+    "tristeza": ["tristeza", "triste", "llanto", "desmotivacion"],
+    "estrés": ["estres", "presion", "agobio"],
+    "preocupación": ["preocupacion", "preocupado"],
+    "miedo": ["miedo", "panico"],
+    "enojo": ["enojo", "ira", "frustracion"],
+    "calma": ["tranquilo", "calma", "relajacion"],
+}
+
+PROGRESS_INDICATORS = {
+    "avances terapéuticos": ["avance", "progreso", "logrados", "logro"],
+    "cumplimiento de tareas": ["cumplio", "tareas"],
+    "mejor estado de ánimo": ["mejor", "mejora", "esperanzado", "motivado"],
+    "mayor autoestima": ["autoestima", "confianza"],
+    "actividad física": ["ejercicio", "deporte"],
+}
+
+RISK_FACTORS = {
+    "ideación de daño": ["daño", "suicidio", "morir", "lastimarse"],
+    "desesperanza": ["desesperanza"],
+    "aislamiento social": ["aislamiento", "soledad"],
+    "crisis de pánico": ["panico"],
+}
+
+# Palabras que invierten el sentido de los términos siguientes ("no", "sin", "menos ansiedad")
+NEGATIONS = {"no", "nunca", "sin", "menos", "ni"}
+NEGATION_WINDOW = 3
+
+
+def _stemmed(lexicon):
+    """Aplica el mismo stemmer que el análisis a las claves de un léxico"""
+    if isinstance(lexicon, dict) and all(isinstance(v, list) for v in lexicon.values()):
+        return {label: {stem(normalize_text(w)) for w in words} for label, words in lexicon.items()}
+    return {stem(normalize_text(w)): weight for w, weight in lexicon.items()}
+
+
+_SENTIMENT = _stemmed(SENTIMENT_LEXICON)
+_CATEGORIES = {
+    "key_topics": _stemmed(THEMES),
+    "emotional_indicators": _stemmed(EMOTIONAL_INDICATORS),
+    "progress_indicators": _stemmed(PROGRESS_INDICATORS),
+    "risk_factors": _stemmed(RISK_FACTORS),
+}
+
+
+def note_hash(note):
+    return hashlib.sha256(f"{ANALYZER_VERSION}:{note}".encode("utf-8")).hexdigest()
+
+
+def analyze_note(note):
+    """Análisis léxico de una nota: sentimiento en [-1, 1] y temas/indicadores
+
+    Un término precedido por una negación a menos de NEGATION_WINDOW tokens
+    invierte su peso de sentimiento y no cuenta como factor de riesgo.
+    """
+    total = 0.0
+    terms, negated_terms = set(), set()
+    negated_until = -1
+    for position, token in enumerate(TOKEN_PATTERN.findall(normalize_text(note or ""))):
+        if token in NEGATIONS:
+            negated_until = position + NEGATION_WINDOW
+            continue
+        if token in SPANISH_STOPWORDS:
+            continue
+        term = stem(token)
+        negated = position <= negated_until
+        weight = _SENTIMENT.get(term, 0.0)
+        total += -weight if negated else weight
+        (negated_terms if negated else terms).add(term)
+
+    analysis = {"sentiment_score": round(total / (total * total + 15) ** 0.5, 3)}
+    for category, labels in _CATEGORIES.items():
+        found = terms if category == "risk_factors" else terms | negated_terms
+        analysis[category] = [label for label, words in labels.items() if words & found]
+    return analysis
+
+
+class SessionAnalysisJob:
+    """Analiza notas de sesiones en paralelo y guarda el resultado en `session_analysis`
+
+    Cada documento de `session_analysis` guarda el hash de la nota que lo
+    produjo. Una sesión cuya nota no cambió se omite sin analizarla, y una
+    nota idéntica ya analizada en otra sesión reutiliza ese análisis; solo
+    el resto se envía al pool de procesos.
+    """
+
+    def __init__(self, db_manager=None, batch_size=2000, workers=None, chunksize=64):
+        self.db_manager = db_manager or DatabaseManager()
+        self.db = self.db_manager.mongo_db
+        self.batch_size = batch_size
+        self.workers = workers
+        self.chunksize = chunksize
+
+    def ensure_indexes(self):
+        self.db["session_analysis"].create_index([("session_id", 1)], unique=True)
+        self.db["session_analysis"].create_index([("note_hash", 1)])
+
+    def iter_sessions(self, collection_name="therapy_sessions_sample"):
+        """Sesiones con notas desde MongoDB (datos de muestra)"""
+        cursor = self.db[collection_name].find(
+            {"notes": {"$nin": [None, ""]}},
+            {"patient_id": 1, "psychologist_id": 1, "session_date": 1, "notes": 1},
+        ).batch_size(self.batch_size)
+        for doc in cursor:
+            yield {**doc, "session_id": str(doc.pop("_id"))}
+
+    def iter_supabase_sessions(self, page_size=1000):
+        """Sesiones con notas desde la tabla therapy_sessions de Supabase"""
+        offset = 0
+        while True:
+            rows = (
+                self.db_manager.supabase.table("therapy_sessions")
+                .select("id, patient_id, psychologist_id, session_date, notes")
+                .not_.is_("notes", "null")
+                .range(offset, offset + page_size - 1)
+                .execute()
+                .data
+            )
+            for row in rows:
+                yield {**row, "session_id": row.pop("id")}
+            if len(rows) < page_size:
+                return
+            offset += page_size
+
+    def _write(self, sessions, hashes, analyses):
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"session_id": session["session_id"]},
+                {
+                    "$set": {
+                        "patient_id": session["patient_id"],
+                        "psychologist_id": session["psychologist_id"],
+                        "session_date": session["session_date"],
+                        "note_hash": h,
+                        "analysis": analysis,
+                        "updated_at": now,
+                    },
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+            for session, h, analysis in zip(sessions, hashes, analyses)
+        ]
+        if operations:
+            self.db["session_analysis"].bulk_write(operations, ordered=False)
+
+    def run(self, sessions=None):
+        """Procesa las sesiones por lotes; devuelve conteos y docs/s"""
+        print("Analizando notas de sesiones...")
+        self.ensure_indexes()
+        sessions = self.iter_sessions() if sessions is None else sessions
+        stats = {"sessions": 0, "unchanged": 0, "cached": 0, "analyzed": 0}
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for batch in batched(sessions, self.batch_size):
+                stats["sessions"] += len(batch)
+                hashes = [note_hash(s["notes"]) for s in batch]
+
+                stored = {
+                    doc["session_id"]: doc["note_hash"]
+                    for doc in self.db["session_analysis"].find(
+                        {"session_id": {"$in": [s["session_id"] for s in batch]}},
+                        {"session_id": 1, "note_hash": 1},
+                    )
+                }
+                pending = [(s, h) for s, h in zip(batch, hashes) if stored.get(s["session_id"]) != h]
+                stats["unchanged"] += len(batch) - len(pending)
+
+                # Notas idénticas ya analizadas (en otras sesiones o repetidas en el lote)
+                known = {
+                    doc["note_hash"]: doc["analysis"]
+                    for doc in self.db["session_analysis"].find(
+                        {"note_hash": {"$in": list({h for _, h in pending})}},
+                        {"note_hash": 1, "analysis": 1},
+                    )
+                }
+                to_analyze = {}
+                for session, h in pending:
+                    if h not in known:
+                        to_analyze.setdefault(h, session["notes"])
+                results = pool.map(analyze_note, to_analyze.values(), chunksize=self.chunksize)
+                known.update(zip(to_analyze.keys(), results))
+                stats["analyzed"] += len(to_analyze)
+                stats["cached"] += len(pending) - len(to_analyze)
+
+                self._write(
+                    [s for s, _ in pending], [h for _, h in pending], [known[h] for _, h in pending]
+                )
+
+        elapsed = time.perf_counter() - start
+        stats["seconds"] = elapsed
+        stats["docs_per_sec"] = stats["sessions"] / elapsed if elapsed > 0 else 0.0
+        print(
+            f"  {stats['sessions']} sesiones: {stats['analyzed']} notas analizadas, "
+            f"{stats['cached']} reutilizadas, {stats['unchanged']} sin cambios "
+            f"({stats['docs_per_sec']:.0f} docs/s)"
+        )
+        return stats
+
+
+def main():
+    """Función principal para el análisis de notas de sesiones"""
+    job = SessionAnalysisJob()
+
+    print("=== ANÁLISIS DE NOTAS DE SESIONES ===\n")
+
+    job.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class QuantileSketch:
+    """Sketch de cuantiles mergeable (estilo KLL) con memoria acotada.
+
+    Con k=200 el error de rango normalizado es ~1.65% con 99% de confianza,
+    y se mantiene tras cualquier número de merges. La memoria es O(k log(n/k)).
+    """
+
+    def __init__(self, k=200, seed=42):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        # Compactar solo mientras el total supere la capacidad global, empezando
+        # por el nivel más bajo lleno (como en KLL) para conservar precisión
+        while self.size() > sum(self._capacity(h) for h in range(len(self.levels))):
+            level = next(h for h in range(len(self.levels)) if len(self.levels[h]) >= self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # Si el número es impar, un elemento queda en el nivel actual
+            keep = items[:1] if len(items) % 2 else items[:0]
+            items = items[len(keep):]
+            offset = self.rng.integers(2)
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+            self.levels[level] = keep
+
+    def update(self, values):
+        """Agrega un lote de valores al sketch"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        # Agregar por bloques para no exceder la memoria acotada del nivel 0
+        for start in range(0, len(values), self.k):
+            self.levels[0] = np.concatenate([self.levels[0], values[start:start + self.k]])
+            self._compress()
+
+    def merge(self, other):
+        """Combina otro sketch (de otro shard o día) en este"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Devuelve los cuantiles aproximados para las probabilidades qs"""
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2 ** h, dtype=float) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items)
+        cum_weights = np.cumsum(weights[order])
+        ranks = np.asarray(qs) * cum_weights[-1]
+        idx = np.minimum(np.searchsorted(cum_weights, ranks, side='left'), len(items) - 1)
+        return items[order][idx]
+
+    def size(self):
+        return sum(len(lvl) for lvl in self.levels)
+
+
+class BinnedHistogram:
+    """Histograma de bins fijos por grupo (p. ej. día de la semana), mergeable.
+
+    Los conteos son exactos; los cuantiles derivados tienen un error máximo
+    de un ancho de bin ((high - low) / bins).
+    """
+
+    def __init__(self, low, high, bins, groups=1):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros((groups, bins), dtype=np.int64)
+        self.sums = np.zeros(groups)
+
+    def update(self, values, groups=None):
+        values = np.asarray(values, dtype=float)
+        groups = np.zeros(len(values), dtype=int) if groups is None else np.asarray(groups, dtype=int)
+        valid = ~np.isnan(values)
+        values, groups = values[valid], groups[valid]
+        bin_idx = np.clip(((values - self.low) / (self.high - self.low) * self.bins).astype(int), 0, self.bins - 1)
+        np.add.at(self.counts, (groups, bin_idx), 1)
+        self.sums += np.bincount(groups, weights=values, minlength=len(self.sums))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.sums += other.sums
+        return self
+
+    def means(self):
+        totals = self.counts.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums / totals
+
+    def quantiles(self, qs, group=0):
+        counts = self.counts[group]
+        cum = np.cumsum(counts)
+        if cum[-1] == 0:
+            return np.full(len(qs), np.nan)
+        idx = np.searchsorted(cum, np.asarray(qs) * cum[-1], side='left')
+        idx = np.minimum(idx, self.bins - 1)
+        return (self.edges[idx] + self.edges[idx + 1]) / 2
+
+
+class CoMomentAccumulator:
+    """Acumula conteo, medias y co-momentos para correlaciones exactas en streaming.
+
+    Usa la actualización por pares de Chan et al., numéricamente estable y
+    exacta (salvo redondeo) al combinar lotes o shards en cualquier orden.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        d = len(self.columns)
+        self.n = 0
+        self.mean = np.zeros(d)
+        self.comoment = np.zeros((d, d))
+
+    def _combine(self, n_b, mean_b, comoment_b):
+        n_a = self.n
+        n = n_a + n_b
+        if n_b == 0:
+            return
+        delta = mean_b - self.mean
+        self.comoment += comoment_b + np.outer(delta, delta) * n_a * n_b / n
+        self.mean += delta * n_b / n
+        self.n = n
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values).any(axis=1)]
+        if len(values) == 0:
+            return
+        mean_b = values.mean(axis=0)
+        centered = values - mean_b
+        self._combine(len(values), mean_b, centered.T @ centered)
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.comoment)
+        return self
+
+    def covariance(self):
+        return self.comoment / max(self.n - 1, 1)
+
+    def correlation(self):
+        std = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = self.comoment / np.outer(std, std)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class MoodStreamSummary:
+    """Resumen mergeable de registros de ánimo procesados por lotes"""
+
+    METRICS = ['mood_score', 'anxiety_level', 'sleep_hours', 'exercise_minutes']
+
+    def __init__(self, k=200):
+        self.n_records = 0
+        self.quantile_sketches = {metric: QuantileSketch(k=k) for metric in self.METRICS}
+        # Escala 1-10 con resolución 0.1: un bin centrado en cada valor posible
+        self.weekday_histogram = BinnedHistogram(0.95, 10.05, 91, groups=7)
+        self.comoments = CoMomentAccumulator(self.METRICS)
+
+    def update(self, chunk):
+        """Procesa un lote de registros (DataFrame o lista de dicts)"""
+        if not isinstance(chunk, pd.DataFrame):
+            chunk = pd.DataFrame(chunk)
+        if len(chunk) == 0:
+            return
+        self.n_records += len(chunk)
+        for metric, sketch in self.quantile_sketches.items():
+            sketch.update(chunk[metric].to_numpy(dtype=float))
+        weekdays = pd.to_datetime(chunk['date']).dt.weekday.to_numpy()
+        self.weekday_histogram.update(chunk['mood_score'].to_numpy(dtype=float), weekdays)
+        self.comoments.update(chunk[self.METRICS].to_numpy(dtype=float))
+
+    def merge(self, other):
+        """Combina el resumen de otro shard o día"""
+        self.n_records += other.n_records
+        for metric, sketch in self.quantile_sketches.items():
+            sketch.merge(other.quantile_sketches[metric])
+        self.weekday_histogram.merge(other.weekday_histogram)
+        self.comoments.merge(other.comoments)
+        return self
+
+    def to_dict(self, qs=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """Resultados listos para exportar al panel de administración"""
+        weekday_means = self.weekday_histogram.means()
+        correlations = self.comoments.correlation()
+        return {
+            'total_records': int(self.n_records),
+            'quantiles': {
+                metric: {str(q): float(v) for q, v in zip(qs, sketch.quantiles(qs))}
+                for metric, sketch in self.quantile_sketches.items()
+            },
+            'weekday_mood': {
+                WEEKDAY_NAMES[day]: {
+                    'mean': float(weekday_means[day]),
+                    'median': float(self.weekday_histogram.quantiles([0.5], group=day)[0]),
+                    'count': int(self.weekday_histogram.counts[day].sum()),
+                }
+                for day in range(7)
+            },
+            'correlations': {
+                metric: float(correlations.loc['mood_score', metric])
+                for metric in self.METRICS if metric != 'mood_score'
+            },
+        }
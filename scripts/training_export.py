@@ -0,0 +1,210 @@
+import os
+import json
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import ObjectId
+from database_setup import DatabaseManager
+
+# Esquema tipado por colección: campo -> tipo de columna
+EXPORT_SCHEMAS = {
+    "mood_logs_sample": {
+        "patient_id": "str",
+        "log_date": "date",
+        "mood_score": np.int16,
+        "anxiety_level": np.int16,
+        "sleep_hours": np.float32,
+        "exercise_minutes": np.int32,
+        "social_interaction": np.bool_,
+    },
+    "therapy_sessions_sample": {
+        "patient_id": "str",
+        "psychologist_id": "str",
+        "session_date": "date",
+        "duration_minutes": np.int16,
+        "session_type": "str",
+        "status": "str",
+        "patient_feedback": np.int16,
+        "therapist_rating": np.int16,
+    },
+}
+
+# Columna de fecha usada para particionar por mes
+PARTITION_FIELDS = {
+    "mood_logs_sample": "log_date",
+    "therapy_sessions_sample": "session_date",
+}
+
+
+class ColumnBuffers:
+    """Buffers de columnas preasignados; se llenan documento a documento sin DataFrames intermedios"""
+
+    def __init__(self, schema, capacity):
+        self.schema = schema
+        self.capacity = capacity
+        self.size = 0
+        self.columns = {}
+        self.valid = {}
+        for field, kind in schema.items():
+            if kind in ("str", "date"):
+                self.columns[field] = np.empty(capacity, dtype=object)
+            else:
+                self.columns[field] = np.zeros(capacity, dtype=kind)
+            self.valid[field] = np.zeros(capacity, dtype=bool)
+
+    def append(self, doc):
+        i = self.size
+        for field, kind in self.schema.items():
+            value = doc.get(field)
+            if value is None:
+                # El buffer se reutiliza entre archivos: no heredar el valor anterior
+                self.valid[field][i] = False
+                continue
+            if kind == "date":
+                value = str(value)[:10]  # ISO 'YYYY-MM-DD', también para datetime
+            self.columns[field][i] = value
+            self.valid[field][i] = True
+        self.size += 1
+
+    @property
+    def full(self):
+        return self.size >= self.capacity
+
+    def to_table(self):
+        arrays = {}
+        for field, kind in self.schema.items():
+            data = self.columns[field][:self.size]
+            mask = ~self.valid[field][:self.size]
+            if kind == "date":
+                data = np.where(mask, None, data)
+                arrays[field] = pa.array(data, type=pa.string()).cast(pa.date32())
+            elif kind == "str":
+                arrays[field] = pa.array(np.where(mask, None, data), type=pa.string())
+            else:
+                arrays[field] = pa.array(data, mask=mask)
+        self.size = 0
+        return pa.table(arrays)
+
+
+class ColumnarExporter:
+    """Exporta colecciones de MongoDB a archivos Parquet particionados por mes
+
+    Lee con proyección y lotes de cursor grandes en orden de `_id`, llena
+    buffers de columnas tipadas y escribe un archivo por lote y partición.
+    Tras cada archivo guarda un checkpoint con el último `_id`, así que una
+    exportación interrumpida continúa donde quedó.
+    """
+
+    def __init__(self, db_manager=None, out_dir="training_data", rows_per_file=500000,
+                 cursor_batch_size=10000):
+        self.db_manager = db_manager or DatabaseManager()
+        self.db = self.db_manager.mongo_db
+        self.out_dir = out_dir
+        self.rows_per_file = rows_per_file
+        self.cursor_batch_size = cursor_batch_size
+
+    def _checkpoint_path(self, collection_name):
+        return os.path.join(self.out_dir, collection_name, "_checkpoint.json")
+
+    def _load_checkpoint(self, collection_name):
+        path = self._checkpoint_path(collection_name)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {"last_id": None, "part": 0, "rows": 0}
+
+    def _save_checkpoint(self, collection_name, checkpoint):
+        path = self._checkpoint_path(collection_name)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _write_part(self, collection_name, table, part):
+        partition_field = PARTITION_FIELDS[collection_name]
+        months = partition_months(table[partition_field])
+        for month in sorted(set(months)):
+            directory = os.path.join(self.out_dir, collection_name, f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            selection = pa.array([m == month for m in months])
+            path = os.path.join(directory, f"part-{part:05d}.parquet")
+            pq.write_table(table.filter(selection), f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+
+    def export_collection(self, collection_name, restart=False):
+        """Exporta una colección de forma reanudable y devuelve filas/s
+
+        Con `restart` se borra la exportación anterior de la colección, para
+        que sus archivos no se mezclen con los nuevos al leer el directorio.
+        """
+        schema = EXPORT_SCHEMAS[collection_name]
+        collection_dir = os.path.join(self.out_dir, collection_name)
+        if restart:
+            shutil.rmtree(collection_dir, ignore_errors=True)
+        os.makedirs(collection_dir, exist_ok=True)
+        checkpoint = {"last_id": None, "part": 0, "rows": 0} if restart \
+            else self._load_checkpoint(collection_name)
+
+        query = {"_id": {"$gt": ObjectId(checkpoint["last_id"])}} if checkpoint["last_id"] else {}
+        projection = {field: 1 for field in schema}
+        cursor = self.db[collection_name].find(query, projection).sort("_id", 1) \
+            .batch_size(self.cursor_batch_size)
+
+        buffers = ColumnBuffers(schema, self.rows_per_file)
+        exported = 0
+        last_id = None
+        start = time.perf_counter()
+
+        def flush():
+            checkpoint["part"] += 1
+            rows = buffers.size
+            self._write_part(collection_name, buffers.to_table(), checkpoint["part"])
+            checkpoint["last_id"] = str(last_id)
+            checkpoint["rows"] += rows
+            self._save_checkpoint(collection_name, checkpoint)
+
+        for doc in cursor:
+            buffers.append(doc)
+            last_id = doc["_id"]
+            exported += 1
+            if buffers.full:
+                flush()
+        if buffers.size:
+            flush()
+
+        elapsed = time.perf_counter() - start
+        rate = exported / elapsed if elapsed > 0 else 0.0
+        print(f"  - {collection_name}: {exported} filas nuevas ({rate:.0f} filas/s), "
+              f"{checkpoint['rows']} en total")
+        return {"collection": collection_name, "rows": exported, "seconds": elapsed, "rows_per_sec": rate}
+
+    def export_all(self, restart=False):
+        print("Exportando colecciones a archivos columnares...")
+        return [self.export_collection(name, restart=restart) for name in EXPORT_SCHEMAS]
+
+
+def partition_months(date_column):
+    """Mes 'YYYY-MM' de cada valor de una columna date32"""
+    values = date_column.to_numpy(zero_copy_only=False).astype("datetime64[M]")
+    return [str(v) for v in values]
+
+
+def load_training_frame(collection_name, out_dir="training_data"):
+    """Carga los archivos exportados de una colección como DataFrame"""
+    return pd.read_parquet(os.path.join(out_dir, collection_name))
+
+
+def main():
+    """Función principal para exportar datos de entrenamiento"""
+    exporter = ColumnarExporter()
+
+    print("=== EXPORTACIÓN DE DATOS DE ENTRENAMIENTO ===\n")
+
+    exporter.export_all()
+
+    print(f"\nArchivos guardados en '{exporter.out_dir}'")
+
+if __name__ == "__main__":
+    main()